@@ -1,12 +1,17 @@
 var mix = {
 	methods: {
-		getHistoryOrder() {
-			this.getData("/api/orders")
+		getHistoryOrder(cursor) {
+			// История выдается постранично, следующая страница - по nextCursor
+			this.getData("/api/orders", cursor ? { cursor } : {})
 				.then(data => {
 					console.log(data)
-					this.orders = data
+					this.orders = cursor ? [...this.orders, ...data.items] : data.items
+					this.nextCursor = data.nextCursor
 				}).catch(() => {
-				this.orders = []
+				if (!cursor) {
+					this.orders = []
+				}
+				this.nextCursor = null
 				console.warn('Ошибка при получении списка заказов')
 			})
 		}
@@ -17,6 +22,7 @@ var mix = {
 	data() {
 		return {
 			orders: [],
+			nextCursor: null,
 		}
 	}
 }
\ No newline at end of file
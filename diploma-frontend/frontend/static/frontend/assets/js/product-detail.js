@@ -26,14 +26,25 @@ var mix = {
                 console.warn('Ошибка при получении товара')
             })
         },
+        getReviews(cursor) {
+            // Страница товара содержит первую страницу отзывов, следующие - по reviewsNextCursor
+            this.getData(`/api/product/${this.product.id}/reviews`, { cursor }).then(data => {
+                this.product.reviews = [...this.product.reviews, ...data.items]
+                this.product.reviewsNextCursor = data.nextCursor
+            }).catch(() => {
+                console.warn('Ошибка при получении отзывов')
+            })
+        },
         submitReview () {
-            this.postData(`/api/product/${this.product.id}/reviews`, {
+            // Ответ - только новый отзыв, уже загруженные страницы и курсор остаются актуальными
+            this.postData(`/api/product/${this.product.id}/reviews?onlyNew=true`, {
                 author: this.review.author,
                 email: this.review.email,
                 text: this.review.text,
                 rate: this.review.rate
             }).then(({data}) => {
-                this.product.reviews = data
+                this.product.reviews = [data, ...(this.product.reviews || [])]
+                this.product.reviewsCount = (this.product.reviewsCount || 0) + 1
                 alert('Отзыв опубликован')
                 this.review.author = ''
                 this.review.email = ''
@@ -38,7 +38,12 @@ class AuthSignInView(APIView):
         else:
             return Response({'message': 'invalid credentials'}, status=500)
 
-        return Response({}, status=200)
+        response = Response({}, status=200)
+
+        # Анонимная корзина перенесена пользователю при входе, ключ больше не нужен.
+        response.delete_cookie('basket_key')
+
+        return response
 
 
 class AuthSignUpView(APIView):
@@ -75,7 +80,12 @@ class AuthSignUpView(APIView):
         else:
             return Response({'message': 'username not available'}, status=500)
 
-        return Response({}, status=200)
+        response = Response({}, status=200)
+
+        # Анонимная корзина перенесена пользователю при регистрации, ключ больше не нужен.
+        response.delete_cookie('basket_key')
+
+        return response
 
 
 class AuthSignOutView(APIView):
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BasketConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'basket'
+
+    def ready(self):
+        # Подключаем обработчики сигналов
+        from . import signals
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from basket.storage import delete_expired_baskets
+
+
+class Command(BaseCommand):
+    """
+    Удаляет брошенные анонимные корзины и их товары.
+    Предназначена для запуска по расписанию (например, cron раз в сутки).
+    """
+
+    help = 'Delete anonymous baskets that were not touched for the given number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Delete baskets untouched for this many days')
+        parser.add_argument('--batch-size', type=int, default=500, help='Baskets deleted per transaction')
+
+    def handle(self, *args, **options):
+        baskets_deleted, items_deleted = delete_expired_baskets(
+            days=options['days'],
+            batch_size=options['batch_size'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {baskets_deleted} baskets and {items_deleted} basket items.'
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 20:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basket', '0011_alter_basket_options_alter_basketitem_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basket',
+            name='lastTouched',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='basket',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['lastTouched'], name='basket_anonymous_touched_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 from catalog.models import Product
 
@@ -30,10 +31,21 @@ class Basket(models.Model):
         verbose_name = 'Basket'
         verbose_name_plural = 'Baskets'
         ordering = ['pk']
+        indexes = [
+            # Поиск устаревших анонимных корзин для удаления (см. basket.storage.delete_expired_baskets)
+            models.Index(
+                fields=['lastTouched'],
+                name='basket_anonymous_touched_idx',
+                condition=models.Q(user__isnull=True),
+            ),
+        ]
 
     user = models.OneToOneField(User, on_delete=models.CASCADE, blank=True, null=True, db_index=True)
     basket_key = models.UUIDField(editable=False, unique=True, blank=True, null=True)
     product = models.ManyToManyField(Product, related_name='basket', through=BasketItem)
 
+    # Время последнего обращения к корзине, по нему удаляются брошенные анонимные корзины.
+    lastTouched = models.DateTimeField(default=timezone.now)
+
     def __str__(self):
         return f'Basket {self.pk}'
@@ -9,6 +9,13 @@ from catalog.serializers import ProductShortSerializer
 
 # Наследуемся от сериализатора товаров и редактируем поля
 class BasketProductSerializer(ProductShortSerializer):
+    """
+    Товар в корзине.
+    Кол-во товара в корзине берется из аннотации `basketCount`.
+    """
+
+    count = serializers.IntegerField(source='basketCount', read_only=True)
+
     class Meta:
         model = Product
         fields = (
@@ -23,4 +30,5 @@ class BasketProductSerializer(ProductShortSerializer):
             'tags',
             'reviews',
             'rating',
+            'count',
         )
@@ -0,0 +1,38 @@
+import uuid
+
+from django.contrib.auth.signals import user_logged_in
+from django.db.transaction import atomic
+from django.dispatch import receiver
+
+from .models import Basket
+from .storage import get_anonymous_storage
+
+
+@receiver(user_logged_in)
+def merge_anonymous_basket(sender, request, user, **kwargs):
+    """
+    Переносит товары из анонимной корзины (по куки `basket_key`) в корзину пользователя.
+
+    Выполняется один раз при входе или регистрации, а не на каждый запрос к корзине.
+    Только здесь анонимная корзина попадает в БД, после переноса она удаляется из хранилища,
+    куки очищают представления входа.
+    """
+
+    basket_key = request.COOKIES.get('basket_key')
+    if not basket_key:
+        return
+
+    try:
+        basket_key = uuid.UUID(basket_key)
+    except ValueError:
+        return
+
+    storage = get_anonymous_storage()
+
+    with atomic():
+        anonymous_basket = storage.get(basket_key)
+        if anonymous_basket is None:
+            return
+
+        basket, created = Basket.objects.get_or_create(user=user)
+        storage.persist(anonymous_basket, basket)
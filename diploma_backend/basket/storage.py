@@ -0,0 +1,432 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import F
+from django.db.transaction import atomic
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from catalog.models import Product
+from .models import Basket, BasketItem
+
+
+def _least_function() -> str:
+    """ Скалярный минимум: в SQLite это MIN(a, b), в остальных БД - LEAST(a, b) """
+    return 'MIN' if connection.vendor == 'sqlite' else 'LEAST'
+
+
+def add_basket_item(basket: Basket, product_id: int, count: int) -> bool:
+    """
+    Добавляет товар в корзину одним запросом (INSERT ... ON CONFLICT DO UPDATE).
+
+    Кол-во товара в корзине увеличивается на `count`, но не превышает остаток на складе.
+    Запрос атомарен, поэтому одновременные добавления из разных вкладок не теряются.
+    Возвращает False, если товара с таким id нет.
+    """
+
+    qn = connection.ops.quote_name
+    least = _least_function()
+    item_table = qn(BasketItem._meta.db_table)
+    product_table = qn(Product._meta.db_table)
+
+    sql = (
+        f'INSERT INTO {item_table} ({qn("basket_id")}, {qn("product_id")}, {qn("count")}) '
+        f'SELECT %s, p.{qn("id")}, {least}(%s, p.{qn("count")}) '
+        f'FROM {product_table} p '
+        f'WHERE p.{qn("id")} = %s AND NOT p.{qn("isDeleted")} '
+        f'ON CONFLICT ({qn("basket_id")}, {qn("product_id")}) DO UPDATE '
+        f'SET {qn("count")} = {least}('
+        f'{item_table}.{qn("count")} + %s, '
+        f'(SELECT p.{qn("count")} FROM {product_table} p WHERE p.{qn("id")} = excluded.{qn("product_id")})'
+        f')'
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [basket.pk, count, product_id, count])
+        return cursor.rowcount > 0
+
+
+def remove_basket_item(basket: Basket, product_id: int, count: int) -> bool:
+    """
+    Уменьшает кол-во товара в корзине на `count`.
+    Если в корзине не больше `count` - товар удаляется.
+
+    Сначала выполняется удаление, затем уменьшение: при гонке с добавлением
+    из другой вкладки товар не удалится вместе с уже увеличенным кол-вом.
+    Возвращает False, если товара в корзине нет.
+    """
+
+    items = BasketItem.objects.filter(basket=basket, product_id=product_id)
+
+    deleted, _ = items.filter(count__lte=count).delete()
+    if deleted:
+        return True
+
+    updated = items.filter(count__gt=count).update(count=F('count') - count)
+    return updated > 0
+
+
+def merge_baskets(source: Basket, target: Basket) -> None:
+    """
+    Переносит товары из корзины `source` в `target` одним запросом.
+
+    Кол-во одинаковых товаров суммируется и ограничивается остатком на складе.
+    Сама корзина `source` не удаляется.
+    """
+
+    qn = connection.ops.quote_name
+    least = _least_function()
+    item_table = qn(BasketItem._meta.db_table)
+    product_table = qn(Product._meta.db_table)
+
+    sql = (
+        f'INSERT INTO {item_table} ({qn("basket_id")}, {qn("product_id")}, {qn("count")}) '
+        f'SELECT %s, i.{qn("product_id")}, {least}(i.{qn("count")}, p.{qn("count")}) '
+        f'FROM {item_table} i '
+        f'INNER JOIN {product_table} p ON p.{qn("id")} = i.{qn("product_id")} '
+        f'WHERE i.{qn("basket_id")} = %s '
+        f'ON CONFLICT ({qn("basket_id")}, {qn("product_id")}) DO UPDATE '
+        f'SET {qn("count")} = {least}('
+        f'{item_table}.{qn("count")} + excluded.{qn("count")}, '
+        f'(SELECT p.{qn("count")} FROM {product_table} p WHERE p.{qn("id")} = excluded.{qn("product_id")})'
+        f')'
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [target.pk, source.pk])
+
+
+class AnonymousBasket:
+    """
+    Корзина анонимного пользователя, хранящаяся вне БД.
+
+    `items` - словарь {id товара: кол-во}.
+    """
+
+    def __init__(self, basket_key: uuid.UUID, items: dict | None = None):
+        self.pk = None
+        self.basket_key = basket_key
+        self.items = items or {}
+
+    def __str__(self):
+        return f'Anonymous basket {self.basket_key}'
+
+
+class BaseBasketStorage:
+    """
+    Хранилище корзин.
+
+    Определяет, где живут корзины и как изменяется их содержимое.
+    """
+
+    def get(self, basket_key: uuid.UUID):
+        """ Возвращает корзину по ключу из куки либо None """
+        raise NotImplementedError
+
+    def create(self, basket_key: uuid.UUID | None = None):
+        """ Создает пустую корзину с переданным либо новым ключом """
+        raise NotImplementedError
+
+    def add(self, basket, product_id: int, count: int) -> bool:
+        raise NotImplementedError
+
+    def remove(self, basket, product_id: int, count: int) -> bool:
+        raise NotImplementedError
+
+    def get_products(self, basket):
+        """ Возвращает товары корзины с кол-вом в атрибуте `basketCount` """
+        raise NotImplementedError
+
+    def persist(self, basket, target: Basket) -> None:
+        """ Переносит товары корзины в корзину пользователя в БД и удаляет исходную корзину """
+        raise NotImplementedError
+
+
+class DatabaseBasketStorage(BaseBasketStorage):
+    """
+    Корзины в таблицах Basket/BasketItem.
+    Используется для пользователей, для анонимов - по настройке.
+    """
+
+    # Просмотр корзины продлевает её жизнь не чаще раза в сутки, чтобы чтение не писало в БД.
+    touch_interval = timedelta(days=1)
+
+    def _touch(self, basket: Basket) -> None:
+        basket.lastTouched = timezone.now()
+        Basket.objects.filter(pk=basket.pk).update(lastTouched=basket.lastTouched)
+
+    def get(self, basket_key):
+        basket = Basket.objects.filter(basket_key=basket_key, user__isnull=True).first()
+
+        if basket and basket.lastTouched < timezone.now() - self.touch_interval:
+            self._touch(basket)
+
+        return basket
+
+    def create(self, basket_key=None):
+        # Пустая корзина не сохраняется, запись появится при добавлении товара (см. add).
+        # Иначе каждый GET без куки (боты, первый заход) добавлял бы строку в таблицу.
+        return Basket(basket_key=basket_key or uuid.uuid4())
+
+    def _save(self, basket: Basket) -> None:
+        """ Сохраняет корзину из create. При одновременных запросах с одним ключом берется уже созданная """
+
+        saved, created = Basket.objects.get_or_create(basket_key=basket.basket_key)
+        basket.pk = saved.pk
+        basket.lastTouched = saved.lastTouched
+
+    def add(self, basket, product_id, count):
+        if basket.pk is None:
+            if not Product.objects.filter(pk=product_id, isDeleted=False).exists():
+                return False
+            self._save(basket)
+
+        if not add_basket_item(basket, product_id, count):
+            return False
+
+        self._touch(basket)
+        return True
+
+    def remove(self, basket, product_id, count):
+        # Несохраненная корзина пуста
+        if basket.pk is None or not remove_basket_item(basket, product_id, count):
+            return False
+
+        self._touch(basket)
+        return True
+
+    def get_products(self, basket):
+        if basket.pk is None:
+            return Product.objects.none()
+
+        # Фиксированное кол-во запросов: товары с кол-вом из корзины, их теги и изображения.
+        return (
+            Product.objects
+            .filter(basketitem__basket=basket)
+            .annotate(basketCount=F('basketitem__count'))
+            .prefetch_related('tags')
+            .prefetch_related('images')
+            .defer('fullDescription', 'sortIndex', 'limited')
+            .order_by('pk')
+        )
+
+    def persist(self, basket, target):
+        if basket.pk is None or basket.pk == target.pk:
+            return
+
+        merge_baskets(basket, target)
+
+        # Товары корзины удаляются каскадно
+        basket.delete()
+
+
+class CacheBasketStorage(BaseBasketStorage):
+    """
+    Анонимные корзины в отдельном общем кэше (алиас `BASKET_CACHE_ALIAS`, например Redis).
+
+    Просмотр сайта без входа не пишет в БД: корзина попадает в таблицы
+    только при входе пользователя (см. basket.signals).
+    Время жизни совпадает со сроком куки `basket_key` и продлевается при каждом изменении.
+
+    Кэш не должен совпадать с кэшем каталога и вытеснять записи (LocMemCache с MAX_ENTRIES),
+    иначе корзины пропадают. LocMemCache у каждого процесса свой, поэтому подходит только для одного процесса.
+
+    Кол-во каждого товара хранится в отдельном ключе и изменяется атомарными add/incr/decr,
+    поэтому одновременные изменения из разных вкладок не теряются.
+    Список товаров корзины - журнал только на добавление, номер записи выдает incr.
+    """
+
+    key_prefix = 'basket'
+
+    def __init__(self):
+        alias = getattr(settings, 'BASKET_CACHE_ALIAS', 'baskets')
+        if alias == getattr(settings, 'CATALOG_CACHE_ALIAS', 'default'):
+            raise ImproperlyConfigured(
+                'BASKET_CACHE_ALIAS must point to a dedicated cache, not to CATALOG_CACHE_ALIAS.'
+            )
+
+        self.cache = caches[alias]
+        self.timeout = getattr(settings, 'BASKET_CACHE_TIMEOUT', 60 * 60 * 24 * 7)
+
+    def _make_key(self, basket_key, *parts) -> str:
+        return ':'.join([self.key_prefix, str(basket_key), *(str(part) for part in parts)])
+
+    def _get_entries(self, basket_key) -> list[str]:
+        """ Ключи записей журнала товаров корзины """
+
+        size = self.cache.get(self._make_key(basket_key, 'size')) or 0
+        return [self._make_key(basket_key, 'entry', number) for number in range(1, size + 1)]
+
+    def _get_product_keys(self, basket_key) -> dict[int, str]:
+        """ Ключи кол-ва товаров корзины {id товара: ключ} """
+
+        product_ids = self.cache.get_many(self._get_entries(basket_key)).values()
+        return {product_id: self._make_key(basket_key, 'product', product_id) for product_id in product_ids}
+
+    def _load_items(self, basket_key) -> dict[int, int]:
+        product_keys = self._get_product_keys(basket_key)
+        counts = self.cache.get_many(list(product_keys.values()))
+
+        return {
+            product_id: counts[key]
+            for product_id, key in product_keys.items()
+            if counts.get(key, 0) > 0
+        }
+
+    def _append_entry(self, basket_key, product_id: int) -> None:
+        """ Добавляет товар в журнал корзины """
+
+        size_key = self._make_key(basket_key, 'size')
+        self.cache.add(size_key, 0, self.timeout)
+        number = self.cache.incr(size_key)
+
+        self.cache.set(self._make_key(basket_key, 'entry', number), product_id, self.timeout)
+
+    def _touch(self, basket_key) -> None:
+        """ Продлевает жизнь всех ключей корзины """
+
+        keys = [
+            self._make_key(basket_key, 'size'),
+            *self._get_entries(basket_key),
+            *self._get_product_keys(basket_key).values(),
+        ]
+        for key in keys:
+            self.cache.touch(key, self.timeout)
+
+    def get(self, basket_key):
+        items = self._load_items(basket_key)
+        if not items:
+            return None
+
+        return AnonymousBasket(basket_key, items)
+
+    def create(self, basket_key=None):
+        # Пустая корзина не сохраняется, запись появится при добавлении товара.
+        return AnonymousBasket(basket_key or uuid.uuid4())
+
+    def add(self, basket, product_id, count):
+        stock = (
+            Product.objects
+            .filter(pk=product_id, isDeleted=False)
+            .values_list('count', flat=True)
+            .first()
+        )
+        if stock is None:
+            return False
+
+        key = self._make_key(basket.basket_key, 'product', product_id)
+        if self.cache.add(key, 0, self.timeout):
+            self._append_entry(basket.basket_key, product_id)
+
+        total = self.cache.incr(key, count)
+
+        # Как и в БД, кол-во в корзине не превышает остаток на складе.
+        # Убираем не больше своего добавления, чтобы не вычесть чужое при одновременных запросах.
+        if total > stock:
+            self.cache.decr(key, min(count, total - stock))
+
+        self._touch(basket.basket_key)
+        return True
+
+    def remove(self, basket, product_id, count):
+        key = self._make_key(basket.basket_key, 'product', product_id)
+        if (self.cache.get(key) or 0) <= 0:
+            return False
+
+        try:
+            total = self.cache.decr(key, count)
+        except ValueError:
+            # Ключ истек
+            return False
+
+        # Удалено больше, чем было в корзине - возвращаем излишек, но не больше своего удаления.
+        # Ключ с нулевым кол-вом не удаляется, чтобы не потерять одновременное добавление.
+        if total < 0:
+            self.cache.incr(key, min(count, -total))
+
+        self._touch(basket.basket_key)
+        return True
+
+    def get_products(self, basket):
+        # Кол-во читается заново: корзина могла измениться после загрузки.
+        basket.items = self._load_items(basket.basket_key)
+
+        products = list(
+            Product.objects
+            .filter(pk__in=basket.items)
+            .prefetch_related('tags')
+            .prefetch_related('images')
+            .defer('fullDescription', 'sortIndex', 'limited')
+            .order_by('pk')
+        )
+
+        for product in products:
+            product.basketCount = basket.items[product.pk]
+
+        return products
+
+    def persist(self, basket, target):
+        basket_key = basket.basket_key
+        product_keys = self._get_product_keys(basket_key)
+
+        for product_id, count in self._load_items(basket_key).items():
+            add_basket_item(target, product_id, count)
+
+        self.cache.delete_many([
+            self._make_key(basket_key, 'size'),
+            *self._get_entries(basket_key),
+            *product_keys.values(),
+        ])
+
+
+def get_anonymous_storage() -> BaseBasketStorage:
+    """
+    Возвращает хранилище корзин анонимных пользователей.
+    Задается настройкой `BASKET_ANONYMOUS_STORAGE`, по умолчанию - БД.
+    """
+
+    storage_path = getattr(settings, 'BASKET_ANONYMOUS_STORAGE', 'basket.storage.DatabaseBasketStorage')
+    return import_string(storage_path)()
+
+
+def get_basket_storage(basket) -> BaseBasketStorage:
+    """ Возвращает хранилище, в котором находится корзина """
+
+    if isinstance(basket, Basket):
+        return DatabaseBasketStorage()
+
+    return get_anonymous_storage()
+
+
+def delete_expired_baskets(days: int = 7, batch_size: int = 500) -> tuple[int, int]:
+    """
+    Удаляет анонимные корзины, к которым не обращались `days` дней, вместе с их товарами.
+
+    Срок по умолчанию совпадает со сроком жизни куки `basket_key`.
+    Удаление идет пачками по `batch_size` корзин, каждая пачка в своей короткой транзакции,
+    поэтому блокировка на запись (в SQLite - на всю БД) не удерживается надолго.
+    Можно вызывать из планировщика (cron, celery beat и т.п.) или командой `clear_baskets`.
+
+    Возвращает кол-во удаленных корзин и товаров в них.
+    """
+
+    cutoff = timezone.now() - timedelta(days=days)
+    expired = Basket.objects.filter(user__isnull=True, lastTouched__lt=cutoff).order_by('lastTouched')
+
+    baskets_deleted = 0
+    items_deleted = 0
+
+    while True:
+        with atomic():
+            basket_ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not basket_ids:
+                break
+
+            items_deleted += BasketItem.objects.filter(basket_id__in=basket_ids).delete()[0]
+            baskets_deleted += Basket.objects.filter(pk__in=basket_ids).delete()[0]
+
+    return baskets_deleted, items_deleted
@@ -1,3 +1,306 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Category, Product, Tag, ProductImage
+from .models import Basket
+from .storage import add_basket_item, remove_basket_item, merge_baskets, delete_expired_baskets, CacheBasketStorage
+from .views import _basket_serialize
+
+
+class BasketSerializeTestCase(TestCase):
+    """
+    Сериализация корзины должна выполняться за фиксированное кол-во запросов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        tag = Tag.objects.create(name='Tag')
+
+        cls.products = []
+        for i in range(10):
+            product = Product.objects.create(title=f'Product {i}', price=10, count=5, rating=0, category=category)
+            product.tags.add(tag)
+            ProductImage.objects.create(product=product)
+            cls.products.append(product)
+
+    def _create_basket(self, items_count: int) -> Basket:
+        basket = Basket.objects.create(basket_key=uuid.uuid4())
+        for i, product in enumerate(self.products[:items_count], start=1):
+            basket.basketitem_set.create(product=product, count=i)
+        return basket
+
+    def test_serialized_data(self):
+        basket = self._create_basket(2)
+
+        data = _basket_serialize(basket)
+
+        self.assertEqual([item['id'] for item in data], [product.pk for product in self.products[:2]])
+        self.assertEqual([item['count'] for item in data], [1, 2])
+        self.assertEqual(len(data[0]['tags']), 1)
+        self.assertEqual(len(data[0]['images']), 1)
+
+    def test_serialize_query_count(self):
+        for items_count in (1, 10):
+            basket = self._create_basket(items_count)
+            with self.assertNumQueries(3):
+                _basket_serialize(basket)
+
+    @override_settings(BASKET_ANONYMOUS_STORAGE='basket.storage.DatabaseBasketStorage')
+    def test_basket_view_query_count_does_not_grow(self):
+        queries = []
+        for items_count in (1, 10):
+            basket = self._create_basket(items_count)
+            self.client.cookies['basket_key'] = str(basket.basket_key)
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('basket:basket'))
+
+            self.assertEqual(len(response.json()), items_count)
+            queries.append(len(context))
+
+        self.assertEqual(queries[0], queries[1])
+
+
+class BasketMutationTestCase(TestCase):
+    """
+    Добавление и удаление товаров выполняются атомарными запросами.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=10, count=5, rating=0, category=category)
+
+    def setUp(self):
+        self.basket = Basket.objects.create(basket_key=uuid.uuid4())
+
+    def _count(self) -> int:
+        return self.basket.basketitem_set.get(product=self.product).count
+
+    def test_add_is_limited_by_stock(self):
+        # Две вкладки добавляют один и тот же товар
+        self.assertTrue(add_basket_item(self.basket, self.product.pk, 3))
+        self.assertTrue(add_basket_item(self.basket, self.product.pk, 3))
+
+        self.assertEqual(self._count(), 5)
+
+    def test_add_unknown_product(self):
+        self.assertFalse(add_basket_item(self.basket, 0, 1))
+        self.assertFalse(self.basket.basketitem_set.exists())
+
+    def test_remove(self):
+        add_basket_item(self.basket, self.product.pk, 4)
+
+        self.assertTrue(remove_basket_item(self.basket, self.product.pk, 1))
+        self.assertEqual(self._count(), 3)
+
+        self.assertTrue(remove_basket_item(self.basket, self.product.pk, 3))
+        self.assertFalse(self.basket.basketitem_set.exists())
+
+        self.assertFalse(remove_basket_item(self.basket, self.product.pk, 1))
+
+    def test_merge_sums_counts_within_stock(self):
+        add_basket_item(self.basket, self.product.pk, 3)
+
+        target = Basket.objects.create(basket_key=uuid.uuid4())
+        add_basket_item(target, self.product.pk, 4)
+
+        merge_baskets(self.basket, target)
+
+        self.assertEqual(target.basketitem_set.get(product=self.product).count, 5)
+        self.assertEqual(self._count(), 3)
+
+
+class DatabaseBasketStorageTestCase(TestCase):
+    """
+    Анонимная корзина в БД сохраняется только при добавлении первого товара.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=10, count=5, rating=0, category=category)
+
+    def test_get_does_not_create_basket(self):
+        response = self.client.get(reverse('basket:basket'))
+        self.assertEqual(response.json(), [])
+        self.assertIn('basket_key', response.cookies)
+
+        response = self.client.delete(
+            reverse('basket:basket'), {'id': self.product.pk, 'count': 1}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse('basket:basket'), {'id': 0, 'count': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(Basket.objects.count(), 0)
+
+    def test_add_creates_basket(self):
+        self.client.get(reverse('basket:basket'))
+        basket_key = uuid.UUID(self.client.cookies['basket_key'].value)
+
+        response = self.client.post(
+            reverse('basket:basket'), {'id': self.product.pk, 'count': 2}, content_type='application/json'
+        )
+        self.assertEqual([(item['id'], item['count']) for item in response.json()], [(self.product.pk, 2)])
+
+        basket = Basket.objects.get()
+        self.assertEqual(basket.basket_key, basket_key)
+        self.assertEqual(basket.basketitem_set.get().count, 2)
+
+
+# Отдельный кэш корзин, как требует CacheBasketStorage
+BASKET_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'baskets': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'baskets'},
+}
+
+
+@override_settings(
+    CACHES=BASKET_CACHES,
+    BASKET_ANONYMOUS_STORAGE='basket.storage.CacheBasketStorage',
+    BASKET_CACHE_ALIAS='baskets',
+)
+class CacheBasketStorageTestCase(TestCase):
+    """
+    Анонимная корзина хранится в кэше и попадает в БД только при входе.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=10, count=5, rating=0, category=category)
+        cls.other = Product.objects.create(title='Other', price=10, count=5, rating=0, category=category)
+        cls.user = User.objects.create_user(username='user', password='password')
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['baskets'].clear()
+        self.basket_key = uuid.uuid4()
+
+    def test_anonymous_basket_does_not_write_to_db(self):
+        response = self.client.get(reverse('basket:basket'))
+        self.assertIn('basket_key', response.cookies)
+
+        response = self.client.post(
+            reverse('basket:basket'), {'id': self.product.pk, 'count': 7}, content_type='application/json'
+        )
+        self.assertEqual([(item['id'], item['count']) for item in response.json()], [(self.product.pk, 5)])
+
+        response = self.client.get(reverse('basket:basket'))
+        self.assertEqual(len(response.json()), 1)
+
+        self.assertFalse(Basket.objects.exists())
+
+    def test_basket_is_persisted_on_login(self):
+        self.client.post(reverse('basket:basket'), {'id': self.product.pk, 'count': 2}, content_type='application/json')
+        basket_key = uuid.UUID(self.client.cookies['basket_key'].value)
+
+        self.client.post(
+            reverse('auth_shop:auth_shop_sign_in'),
+            {'username': 'user', 'password': 'password'},
+            content_type='application/json',
+        )
+
+        basket = Basket.objects.get(user=self.user)
+        self.assertEqual(basket.basketitem_set.get(product=self.product).count, 2)
+        self.assertEqual(Basket.objects.count(), 1)
+
+        # После переноса корзины в кэше не остается
+        self.assertIsNone(CacheBasketStorage().get(basket_key))
+
+    def test_concurrent_changes_are_not_lost(self):
+        storage = CacheBasketStorage()
+        storage.add(storage.create(self.basket_key), self.product.pk, 1)
+
+        # Две вкладки загрузили корзину до изменений друг друга
+        first = storage.get(self.basket_key)
+        second = storage.get(self.basket_key)
+
+        storage.add(first, self.product.pk, 1)
+        storage.add(second, self.product.pk, 1)
+        storage.add(second, self.other.pk, 1)
+
+        self.assertEqual(storage.get(self.basket_key).items, {self.product.pk: 3, self.other.pk: 1})
+
+        # Кол-во ограничено остатком, лишнее удаление не уводит кол-во в минус
+        storage.add(first, self.product.pk, 10)
+        storage.remove(first, self.other.pk, 10)
+        self.assertEqual(storage.get(self.basket_key).items, {self.product.pk: 5})
+
+        self.assertFalse(storage.remove(first, self.other.pk, 1))
+        self.assertTrue(storage.add(first, self.other.pk, 2))
+        self.assertEqual(storage.get(self.basket_key).items, {self.product.pk: 5, self.other.pk: 2})
+
+    @override_settings(BASKET_CACHE_ALIAS='default')
+    def test_catalog_cache_alias_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CacheBasketStorage()
+
+
+class CatalogCacheChurnTestCase(TestCase):
+    """
+    Анонимная корзина не пропадает при вытеснении записей кэша каталога.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=10, count=5, rating=0, category=category)
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+
+    def _assert_basket_survives(self):
+        self.client.post(reverse('basket:basket'), {'id': self.product.pk, 'count': 1}, content_type='application/json')
+
+        # Каждый набор фильтров кэширует свое кол-во товаров, LocMemCache вытесняет старые записи
+        for i in range(400):
+            self.client.get(reverse('catalog:catalog_menu'), {'sort': 'price', 'limit': 20, 'filter[minPrice]': i})
+
+        response = self.client.get(reverse('basket:basket'))
+        self.assertEqual([(item['id'], item['count']) for item in response.json()], [(self.product.pk, 1)])
+
+    def test_database_storage(self):
+        self._assert_basket_survives()
+
+    @override_settings(
+        CACHES=BASKET_CACHES,
+        BASKET_ANONYMOUS_STORAGE='basket.storage.CacheBasketStorage',
+        BASKET_CACHE_ALIAS='baskets',
+    )
+    def test_cache_storage(self):
+        self._assert_basket_survives()
+
+
+class DeleteExpiredBasketsTestCase(TestCase):
+    """
+    Удаляются только давно не использованные анонимные корзины.
+    """
+
+    def test_delete_expired(self):
+        category = Category.objects.create(title='Category')
+        product = Product.objects.create(title='Product', price=10, count=5, rating=0, category=category)
+        user = User.objects.create_user(username='user', password='password')
+        old = timezone.now() - timedelta(days=8)
+
+        for i in range(3):
+            basket = Basket.objects.create(basket_key=uuid.uuid4(), lastTouched=old)
+            basket.basketitem_set.create(product=product)
+        fresh = Basket.objects.create(basket_key=uuid.uuid4())
+        user_basket = Basket.objects.create(user=user, lastTouched=old)
+
+        self.assertEqual(delete_expired_baskets(days=7, batch_size=2), (3, 3))
+        self.assertQuerySetEqual(Basket.objects.order_by('pk'), [fresh, user_basket])
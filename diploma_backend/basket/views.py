@@ -1,142 +1,75 @@
 import uuid
 
-from django.db import IntegrityError
-
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .models import Basket
 from .serializers import BasketProductSerializer
+from .storage import AnonymousBasket, get_anonymous_storage, get_basket_storage
 
 
-def _get_basket(request: Request) -> tuple[Basket, bool]:
+def _get_basket(request: Request) -> tuple[Basket | AnonymousBasket, bool]:
     """
     Функция для получения корзины.
 
     Получает на вход объект Request
-    Возвращает объект Basket привязанный к COOKIES или user,
+    Возвращает объект Basket привязанный к user либо корзину анонимного пользователя по COOKIES,
     а также is_created, сообщающее о создании новых куки.
 
     Создана во избежание дублирования кода.
+    Анонимные корзины находятся в хранилище из настройки `BASKET_ANONYMOUS_STORAGE` (см. basket.storage),
+    перенос товаров в корзину пользователя выполняется один раз при входе (см. basket.signals).
     """
 
     # Если корзина и куки только создались, сообщаем об этом функции
     is_created = False
 
-    # Используем в качестве ключа к корзине - uuid
-    basket_key = request.COOKIES.get('basket_key')
-
     # Корзина пользователя User.
     if request.user.is_authenticated:
-        user = request.user
-
-        # Пробуем получить корзину пользователя
-        try:
-            basket = (
-                Basket.objects
-                .prefetch_related('basketitem_set')
-                .get(user=user)
-            )
-
-            # Здесь логика проверки того, что в анонимной корзине были товары, а пользовательская была пустой.
-            # Если же пользовательская чем-то заполнена - простая очистка анонимной.
-
-            # P.S. Если товары не передать пользователю - при выходе они вновь отобразятся, что не совсем корректно.
-
-            # Если есть ключ и корзина пользователя пуста - пытаемся получить анонимную корзину.
-            if basket_key and not basket.basketitem_set.exists():
-                cookie_basket = Basket.objects.prefetch_related('basketitem_set').filter(basket_key=basket_key)
-
-                # Если корзина существует - проверяем что она не пуста.
-                if cookie_basket.exists():
-                    if cookie_basket.first().basketitem_set.exists():
-                        # Передаем объекты пользователю
-                        basket.basketitem_set.set(cookie_basket.first().basketitem_set.all())
-
-            # Очистка анонимной корзины
-            elif basket_key:
-                cookie_basket = Basket.objects.prefetch_related('basketitem_set').filter(basket_key=basket_key)
-
-                if cookie_basket.exists():
-                    cookie_basket.first().basketitem_set.all().delete()
-
-        except Basket.DoesNotExist:
-            # Подразумевается, что это для новых пользователей, прошедших регистрацию.
+        basket, created_or_not = Basket.objects.get_or_create(user=request.user)
+        return basket, is_created
 
-            # Создаем для пользователя новую корзину.
-            basket = Basket.objects.create(user=user)
+    storage = get_anonymous_storage()
 
-            # Если есть ключ - идет процедура перебазирования товаров
-            if basket_key:
-
-                # Пытаемся получить QuerySet с корзиной внутри.
-                cookie_basket = Basket.objects.prefetch_related('basketitem_set').filter(basket_key=basket_key)
-
-                # Если корзина существует - проверяем что она не пуста.
-                if cookie_basket.exists():
-                    if cookie_basket.first().basketitem_set.exists():
-                        # Передаем объекты пользователю
-                        basket.basketitem_set.set(cookie_basket.first().basketitem_set.all())
+    # Используем в качестве ключа к корзине - uuid
+    try:
+        basket_key = uuid.UUID(request.COOKIES['basket_key'])
+    except (KeyError, ValueError):
+        basket_key = None
 
     # Корзина только по ключу.
-    elif basket_key:
-
-        # Используем get_or_create на случай отсутствия корзины по ключу.
-        basket, created_or_not = (
-            Basket.objects
-            .prefetch_related('basketitem_set')
-            .get_or_create(basket_key=basket_key)
-        )
+    if basket_key:
+        # Если корзины по ключу нет (например, истек срок хранения) - создаем пустую с этим ключом.
+        basket = storage.get(basket_key) or storage.create(basket_key)
 
     # Создание нового ключа и корзины
     else:
 
         # Подразумевается, что это для случаев первого входа на сайт
         # или сгоревших куки у не вошедших пользователей.
-        basket_key = uuid.uuid4()
-        basket = basket = (
-            Basket.objects
-            .prefetch_related('basketitem_set')
-            .create(basket_key=basket_key)
-        )
+        basket = storage.create()
         is_created = True
 
     return basket, is_created
 
 
-def _basket_serialize(basket) -> list:
+def _basket_serialize(basket: Basket | AnonymousBasket) -> list:
     """
     Функция для сериализации продуктов в корзине.
 
-    Получает на вход объект Basket
+    Получает на вход объект Basket или корзину анонимного пользователя
     Возвращает список словарей с полями продукта и кол-вом его в корзине.
 
-    Создана во избежание дублирования кода.
+    Выполняет фиксированное кол-во запросов независимо от кол-ва товаров:
+    товары с кол-вом из корзины, их теги и изображения.
     """
 
-    basket_data = []
-
-    # Проходимся по списку отсортированных товаров
-    for basket_item in (
-        # Оптимизируем запрос
-        basket.basketitem_set
-        .prefetch_related('product')
-        .select_related('product__category')
-        .prefetch_related('product__tags')
-        .prefetch_related('product__reviews')
-        .prefetch_related('product__images')
-        .order_by('product')
-    ):
-        serialized = BasketProductSerializer(basket_item.product)
+    products = get_basket_storage(basket).get_products(basket)
 
-        # Добавляем в data ключ count, перед этим копируем словарь из сериализатора
-        serialized_data_with_count = serialized.data
-        serialized_data_with_count['count'] = basket_item.count
+    serialized = BasketProductSerializer(products, many=True)
 
-        basket_data.append(serialized_data_with_count)
-
-    return basket_data
+    return serialized.data
 
 
 class BasketView(APIView):
@@ -164,39 +97,21 @@ class BasketView(APIView):
         try:
             # Базовая валидация
             # Если передано отрицательное либо дробное число - вызываем ошибку
-            if request.data['count'] < 0 or not isinstance(request.data['count'], int):
+            if not isinstance(request.data['count'], int) or request.data['count'] < 0:
                 raise ValueError
 
-            # Получаем QuerySet с одним товаром в корзине
-            basket_item_queryset = (
-                basket.basketitem_set
-                .filter(product_id=request.data['id'])
-                .prefetch_related('product')
-            )
-
-            # Проверяем что товар есть в корзине, иначе добавляем
-            if not basket_item_queryset.exists():
-                basket.basketitem_set.create(product_id=request.data['id'], count=0)
-
-            # Кол-во товара в корзине
-            count = basket_item_queryset.first().count
-
-            # Обновляем QuerySet путем увеличения кол-ва товара
-            # Проверяем, что товара в корзине не больше, чем на складе, т.е. Product.count
-            # Если это так - указываем максимально допустимое кол-во
-            if count + request.data['count'] >= basket_item_queryset.first().product.count:
-                product_count = basket_item_queryset.first().product.count
-                basket_item_queryset.update(count=product_count)
-            else:
-                basket_item_queryset.update(count=(count + request.data['count']))
+            if not isinstance(request.data['id'], int):
+                return Response({'message': 'id must be an integer'}, status=400)
+
+            # Добавляем товар одним атомарным запросом.
+            # Кол-во в корзине ограничивается остатком на складе, т.е. Product.count
+            if not get_basket_storage(basket).add(basket, request.data['id'], request.data['count']):
+                return Response({'message': f'No product with id {request.data["id"]}'}, status=400)
 
         except ValueError as e:
             return Response({'message': 'count must be an integer and a positive'}, status=400)
         except KeyError as e:
             return Response({'message': f'Wrong params: {e}'}, status=400)
-        except IntegrityError as e:
-            if 'FOREIGN KEY' in e.args[0]:
-                return Response({'message': f'No product with id {request.data["id"]}'}, status=400)
 
         basket_data = _basket_serialize(basket)
 
@@ -214,29 +129,18 @@ class BasketView(APIView):
         try:
             # Базовая валидация
             # Если передано отрицательное либо дробное число - вызываем ошибку
-            if request.data['count'] < 0 or not isinstance(request.data['count'], int):
+            if not isinstance(request.data['count'], int) or request.data['count'] < 0:
                 raise ValueError
 
-            # Получаем QuerySet с одним товаром в корзине, а также его кол-во
-            basket_item_queryset = (
-                basket.basketitem_set
-                .filter(product_id=request.data['id'])
-                .prefetch_related('product')
-            )
-            count = basket_item_queryset.first().count
-
-            # Если приходит запрос с кол-вом равным текущему или более - товар удаляется из корзины
-            if count <= request.data['count']:
-                basket_item_queryset.delete()
-            else:
-                basket_item_queryset.update(count=(count - request.data['count']))
+            # Если приходит запрос с кол-вом равным текущему или более - товар удаляется из корзины,
+            # иначе кол-во уменьшается.
+            if not get_basket_storage(basket).remove(basket, request.data['id'], request.data['count']):
+                return Response({'message': 'Product not in basket'}, status=400)
 
         except ValueError as e:
             return Response({'message': 'count must be an integer and a positive'}, status=400)
         except KeyError as e:
             return Response({'message': f'Wrong params: {e}'}, status=400)
-        except (IntegrityError, AttributeError) as e:
-            return Response({'message': 'Product not in basket'}, status=400)
 
         basket_data = _basket_serialize(basket)
 
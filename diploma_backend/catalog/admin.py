@@ -1,4 +1,5 @@
 from django.contrib import admin, messages
+from django.db import transaction
 
 from .models import (
     Product,
@@ -8,8 +9,10 @@ from .models import (
     CategoryImage,
     Reviews,
     Specifications,
-    SaleProducts
+    SaleProducts,
+    PopularProduct
 )
+from .cache import bump_catalog_version, invalidate_product_on_commit
 
 
 class ProductImagesInline(admin.TabularInline):
@@ -35,11 +38,14 @@ class SpecificationsInline(admin.StackedInline):
 @admin.action(description='Mark product undeleted')
 def mark_product_objects_undeleted(modeladmin, request, queryset):
     queryset.update(isDeleted=False)
+    transaction.on_commit(bump_catalog_version)
+    invalidate_product_on_commit(*queryset.values_list('pk', flat=True))
     modeladmin.message_user(request, 'Товары успешно помечены как актуальные.', messages.SUCCESS)
 
 @admin.action(description='Mark category undeleted')
 def mark_category_objects_undeleted(modeladmin, request, queryset):
     queryset.update(isDeleted=False)
+    transaction.on_commit(bump_catalog_version)
     modeladmin.message_user(request, 'Категории успешно помечены как актуальные.', messages.SUCCESS)
 
 
@@ -76,14 +82,14 @@ class ProductAdmin(admin.ModelAdmin):
         mark_product_objects_undeleted
     ]
 
-    readonly_fields = ('date', )
+    readonly_fields = ('date', 'reviewsCount', 'rateSum')
 
     fieldsets = (
         ('Общая информация', {
             'fields': ('title', 'description', 'fullDescription', 'price', 'freeDelivery', 'date')
         }),
         ('Продажи и наличие', {
-            'fields': ('count', 'limited', 'sold', 'rating'),
+            'fields': ('count', 'limited', 'sold', 'rating', 'reviewsCount', 'rateSum'),
             'description': 'Информация о наличии товара, кол-ве продаж и рейтинге.'
         }),
         ('Категория и теги', {
@@ -112,6 +118,10 @@ class ProductAdmin(admin.ModelAdmin):
         """ Мягкое удаление """
         queryset.update(isDeleted=True)
 
+        # update() не отправляет сигналы, поэтому сбрасываем кэш каталога и страниц товаров вручную.
+        transaction.on_commit(bump_catalog_version)
+        invalidate_product_on_commit(*queryset.values_list('pk', flat=True))
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -152,6 +162,9 @@ class CategoryAdmin(admin.ModelAdmin):
         """ Мягкое удаление """
         queryset.update(isDeleted=True)
 
+        # update() не отправляет сигналы, поэтому сбрасываем кэш каталога вручную.
+        transaction.on_commit(bump_catalog_version)
+
 
 @admin.register(CategoryImage)
 class CategoryImageAdmin(admin.ModelAdmin):
@@ -269,3 +282,27 @@ class SaleProductAdmin(admin.ModelAdmin):
             'fields': ('salePrice', 'dateFrom', 'dateTo')
         })
     )
+
+
+@admin.register(PopularProduct)
+class PopularProductAdmin(admin.ModelAdmin):
+    """ Рейтинг только для просмотра, он пересчитывается командой `refresh_popular_products` """
+
+    ordering = ['position']
+
+    list_display = (
+        'position',
+        'product',
+        'score',
+        'computedAt'
+    )
+    list_display_links = (
+        'position',
+        'product'
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
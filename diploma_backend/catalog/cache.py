@@ -0,0 +1,185 @@
+import hashlib
+import json
+import time
+from functools import partial
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# Ключ с текущей версией каталога.
+# Любое изменение каталога увеличивает версию, и все закэшированные ответы устаревают сразу.
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Время жизни ответов по умолчанию, в секундах.
+DEFAULT_TIMEOUTS = {
+    'banners': 60 * 5,
+    'popular': 60 * 5,
+    'limited': 60 * 5,
+    'tags': 60 * 30,
+    'categories': 60 * 30,
+    'count': 30,
+    'estimatedCount': 60 * 10,
+    'facets': 60,
+    'product': 60 * 30,
+}
+
+
+def _get_cache():
+    """
+    Возвращает кэш каталога.
+    Бэкенд выбирается через `CATALOG_CACHE_ALIAS`, по умолчанию - `default` из `CACHES`.
+    """
+
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _get_timeout(name: str) -> int:
+    timeouts = {**DEFAULT_TIMEOUTS, **getattr(settings, 'CATALOG_CACHE_TIMEOUTS', {})}
+    return timeouts.get(name, 60)
+
+
+def get_catalog_version() -> int:
+    """
+    Возвращает текущую версию каталога.
+    Начальное значение берется из времени, чтобы после вытеснения ключа
+    версия не совпала ни с одной из ранее использованных.
+    """
+
+    cache = _get_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+
+    return version
+
+
+def bump_catalog_version() -> None:
+    """
+    Увеличивает версию каталога, тем самым инвалидируя все закэшированные ответы.
+    """
+
+    cache = _get_cache()
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Ключа нет - следующий запрос версии создаст новую.
+        pass
+
+
+def get_cached_payload(name: str, build: Callable[[], list | dict], timeout_name: str | None = None) -> list | dict:
+    """
+    Возвращает данные ответа из кэша либо строит их при помощи `build` и кэширует.
+
+    name - название endpoint'а, определяет ключ и время жизни.
+    build - функция без аргументов, возвращающая сериализованные данные.
+    timeout_name - название для выбора времени жизни, если оно отличается от `name`.
+    """
+
+    cache = _get_cache()
+    key = f'catalog:{name}:{get_catalog_version()}'
+
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, timeout=_get_timeout(timeout_name or name))
+
+    return payload
+
+
+def _get_product_key(pk: int, *parts) -> str:
+    return ':'.join(['catalog:product', str(pk), *(str(part) for part in parts)])
+
+
+def get_product_version(pk: int) -> int:
+    """
+    Возвращает текущую версию страницы товара, как `get_catalog_version` для каталога.
+
+    Версию нужно получить до чтения товара из БД: если товар изменится во время построения ответа,
+    запись ляжет под уже устаревшей версией и не будет отдана.
+    """
+
+    cache = _get_cache()
+    key = _get_product_key(pk, 'version')
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def get_cached_product(pk: int, version: int) -> dict | None:
+    """
+    Возвращает закэшированную страницу товара либо None.
+
+    Страница товара кэшируется отдельно от версии каталога и устаревает
+    только при изменении самого товара (см. invalidate_product).
+    Словарь содержит данные ответа `payload`, а также `etag` и `lastModified` для условных запросов.
+    """
+
+    return _get_cache().get(_get_product_key(pk, version))
+
+
+def _get_last_modified(pk: int) -> int:
+    """
+    Время построения страницы товара в секундах.
+    Строго больше предыдущего, иначе пересобранная в ту же секунду страница
+    ответила бы 304 на If-Modified-Since со старой.
+    """
+
+    cache = _get_cache()
+    key = _get_product_key(pk, 'modified')
+
+    last_modified = max(int(time.time()), (cache.get(key) or 0) + 1)
+    cache.set(key, last_modified, timeout=None)
+
+    return last_modified
+
+
+def set_cached_product(pk: int, version: int, payload: dict) -> dict:
+    """
+    Кэширует данные страницы товара вместе с ETag (хэш содержимого) и временем построения.
+    version - версия товара, полученная до чтения из БД (см. get_product_version).
+    Возвращает сохраненный словарь.
+    """
+
+    content = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    entry = {
+        'payload': payload,
+        'etag': f'"{hashlib.md5(content.encode()).hexdigest()}"',
+        'lastModified': _get_last_modified(pk),
+    }
+
+    _get_cache().set(_get_product_key(pk, version), entry, timeout=_get_timeout('product'))
+
+    return entry
+
+
+def invalidate_product(*pks: int) -> None:
+    """
+    Сбрасывает закэшированные страницы товаров, увеличивая их версии.
+    """
+
+    cache = _get_cache()
+    for pk in pks:
+        try:
+            cache.incr(_get_product_key(pk, 'version'))
+        except ValueError:
+            # Ключа нет - следующий запрос версии создаст новую.
+            pass
+
+
+def invalidate_product_on_commit(*pks: int) -> None:
+    """
+    Сбрасывает страницы товаров после фиксации текущей транзакции (вне транзакции - сразу).
+    При сбросе внутри транзакции параллельный запрос успел бы закэшировать
+    еще не измененный товар на все время жизни записи.
+    """
+
+    transaction.on_commit(partial(invalidate_product, *pks))
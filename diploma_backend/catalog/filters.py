@@ -0,0 +1,147 @@
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import QuerySet, Q, Exists, OuterRef
+from django.http import QueryDict
+
+from rest_framework.exceptions import ValidationError
+
+from .models import Product
+from .search import get_search_backend
+
+
+def _parse_decimal(value: str | None, name: str) -> Decimal | None:
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({'message': f'{name} must be a number'})
+
+    # NaN и Infinity не сравнимы с ценой в БД
+    if not number.is_finite():
+        raise ValidationError({'message': f'{name} must be a number'})
+
+    return number
+
+
+def _parse_int_list(values: list[str], name: str) -> list[int]:
+    try:
+        return sorted({int(value) for value in values})
+    except ValueError:
+        raise ValidationError({'message': f'{name} must be a list of integers'})
+
+
+def parse_catalog_filters(params: QueryDict) -> dict:
+    """
+    Приводит параметры фильтрации каталога к нормализованному виду.
+
+    Одинаковые по смыслу наборы параметров (порядок тегов, '100' и '100.00' в цене)
+    дают одинаковый результат, поэтому словарь можно использовать как ключ кэша.
+    Регистр названия сохраняется: LIKE в SQLite не учитывает регистр только для ASCII,
+    и кириллическое название нашлось бы не при любом регистре запроса.
+    """
+
+    category = params.get('category')
+    if category:
+        try:
+            category = int(category)
+        except ValueError:
+            raise ValidationError({'message': 'category must be an integer'})
+
+    min_price = _parse_decimal(params.get('filter[minPrice]'), 'filter[minPrice]')
+    max_price = _parse_decimal(params.get('filter[maxPrice]'), 'filter[maxPrice]')
+
+    return {
+        'name': (params.get('filter[name]') or '').strip(),
+        'minPrice': str(min_price.normalize()) if min_price is not None else None,
+        'maxPrice': str(max_price.normalize()) if max_price is not None else None,
+        'freeDelivery': params.get('filter[freeDelivery]') == 'true',
+        'available': params.get('filter[available]') == 'true',
+        'tags': _parse_int_list(params.getlist('tags[]', default=[]), 'tags[]'),
+        'category': category or None,
+    }
+
+
+def get_filter_conditions(filters: dict) -> dict[str, Q]:
+    """
+    Условия нормализованных фильтров по измерениям: price, freeDelivery, available, tags, category.
+    Измерения без выбранного значения не попадают в словарь.
+    Поиск по названию применяется поисковым бэкендом к QuerySet и сюда не входит.
+    """
+
+    conditions = {}
+
+    # Цена с учетом действующих скидок (индексы product_price_idx и product_category_price_idx)
+    price = Q()
+    if filters['minPrice'] is not None:
+        price &= Q(effectivePrice__gte=filters['minPrice'])
+
+    if filters['maxPrice'] is not None:
+        price &= Q(effectivePrice__lte=filters['maxPrice'])
+
+    if price:
+        conditions['price'] = price
+
+    # Отдельная проверка бесплатной доставки
+    # Если передано false - будут выведены товары с бесплатной и платной.
+    if filters['freeDelivery']:
+        conditions['freeDelivery'] = Q(freeDelivery=True)
+
+    # Отдельная проверка на наличие
+    if filters['available']:
+        conditions['available'] = Q(count__gt=0)
+
+    # Фильтрация по тегам. Товар должен включать хотя бы один из переданных.
+    # Без передачи тегов выводятся все товары
+    # Через EXISTS, а не JOIN + DISTINCT: строки товаров не размножаются по тегам
+    # и не требуют дедупликации перед сортировкой и постраничным выводом.
+    if filters['tags']:
+        conditions['tags'] = Q(Exists(
+            Product.tags.through.objects.filter(product_id=OuterRef('pk'), tag_id__in=filters['tags'])
+        ))
+
+    # Соответствие товара выбранной категории
+    if filters['category']:
+        conditions['category'] = Q(category=filters['category'])
+
+    return conditions
+
+
+def filter_catalog_queryset(products: QuerySet, filters: dict, exclude: tuple[str, ...] = ()) -> QuerySet:
+    """
+    Применяет нормализованные фильтры к QuerySet товаров.
+    Удаленные товары исключаются всегда.
+
+    exclude - измерения из `get_filter_conditions`, которые не применяются (для фасетов).
+    """
+
+    products = products.filter(isDeleted=False)
+
+    # Поиск по названию, описанию и тегам через поисковый бэкенд (полнотекстовый индекс)
+    if filters['name']:
+        products = get_search_backend().filter(products, filters['name'])
+
+    for dimension, condition in get_filter_conditions(filters).items():
+        if dimension not in exclude:
+            products = products.filter(condition)
+
+    return products
+
+
+def is_broad_filter(filters: dict) -> bool:
+    """
+    Широкий фильтр - без поиска по названию и без условий из `get_filter_conditions`
+    (цена, бесплатная доставка, наличие, теги, категория).
+    Под него попадает весь каталог, поэтому его кол-во можно оценивать.
+    Даже узкий диапазон цены может оставить единицы товаров, и оценка дала бы лишние пустые страницы.
+    """
+
+    return not (filters['name'] or get_filter_conditions(filters))
+
+
+def get_filters_key(filters: dict) -> str:
+    """ Короткий ключ нормализованного набора фильтров """
+    dumped = json.dumps(filters, sort_keys=True)
+    return hashlib.sha1(dumped.encode()).hexdigest()
@@ -0,0 +1,60 @@
+from time import perf_counter
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from catalog.models import Product, Tag
+from .explain_catalog import explain
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает фильтрацию каталога по тегам через JOIN + DISTINCT и через EXISTS.
+    Для каждого варианта выводит план и среднее время страницы и подсчета кол-ва.
+    """
+
+    help = 'Compare DISTINCT and EXISTS plans of the catalog tag filter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Seed 100k products with 20 tags before measuring')
+        parser.add_argument('--filter-tags', type=int, default=3, help='Number of tags in the filter')
+        parser.add_argument('--page-size', type=int, default=20, help='Products per page')
+        parser.add_argument('--repeat', type=int, default=5, help='Measurements per variant')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            call_command('seed_catalog', products=100_000, tags=20, stdout=self.stdout)
+
+        tags = list(Tag.objects.order_by('pk').values_list('pk', flat=True)[:options['filter_tags']])
+        base = Product.objects.filter(isDeleted=False)
+
+        variants = {
+            'JOIN + DISTINCT': base.filter(tags__in=tags).distinct(),
+            'EXISTS': base.filter(Exists(
+                Product.tags.through.objects.filter(product_id=OuterRef('pk'), tag_id__in=tags)
+            )),
+            'IN (subquery)': base.filter(pk__in=(
+                Product.tags.through.objects.filter(tag_id__in=tags).values('product_id')
+            )),
+        }
+
+        self.stdout.write(f'Products: {Product.objects.count()}, filter tags: {tags}\n')
+
+        for name, queryset in variants.items():
+            page = queryset.order_by('-price')[:options['page_size']]
+
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(explain(page))
+            self.stdout.write(
+                f'page: {self._measure(lambda: list(page), options["repeat"]):.2f} ms, '
+                f'count: {self._measure(queryset.count, options["repeat"]):.2f} ms\n'
+            )
+
+    @staticmethod
+    def _measure(func, repeat: int) -> float:
+        """ Среднее время выполнения в миллисекундах """
+        started = perf_counter()
+        for _ in range(repeat):
+            func()
+        return (perf_counter() - started) / repeat * 1000
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import QuerySet
+from django.http import QueryDict
+
+from catalog.filters import parse_catalog_filters, filter_catalog_queryset
+from catalog.models import Category, Product
+from catalog.views import BannersListView, PopularListView, LimitedListView
+
+
+def explain(queryset: QuerySet, **options) -> str:
+    """
+    EXPLAIN по готовому SQL запроса.
+    QuerySet.explain() не работает с фильтрацией по оконным функциям (баннеры),
+    т.к. Django добавляет префикс EXPLAIN и во вложенный запрос.
+    """
+
+    sql, params = queryset.query.sql_with_params()
+    prefix = connection.ops.explain_query_prefix(**options)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        rows = cursor.fetchall()
+
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+class Command(BaseCommand):
+    """
+    Выводит планы выполнения (EXPLAIN) основных запросов каталога.
+    Позволяет проверить, какие из них используют индексы.
+    """
+
+    help = 'Print EXPLAIN plans for the catalog endpoint queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE (PostgreSQL only)')
+
+    def handle(self, *args, **options):
+        explain_options = {'analyze': True} if options['analyze'] else {}
+
+        category = Category.objects.filter(isDeleted=False).values_list('pk', flat=True).first()
+
+        for name, queryset in self._get_querysets(category):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(explain(queryset, **explain_options))
+            self.stdout.write('')
+
+    def _get_querysets(self, category: int | None) -> list:
+        """ Запросы в том виде, в котором их строят представления """
+
+        def catalog(query: str, ordering: str):
+            filters = parse_catalog_filters(QueryDict(query))
+            return filter_catalog_queryset(Product.objects.all(), filters).order_by(ordering)[:20]
+
+        querysets = [
+            ('banners', BannersListView().get_queryset()),
+            ('products/popular', PopularListView().get_queryset()),
+            ('products/popular (fallback)', PopularListView().get_fallback_queryset()),
+            ('products/limited', LimitedListView().get_queryset()),
+            ('catalog: price range, sort by price', catalog('filter[minPrice]=100&filter[maxPrice]=5000', 'effectivePrice')),
+            ('catalog: name search', catalog('filter[name]=product 1', '-rating')),
+            ('catalog: tags', catalog('tags[]=1&tags[]=2', 'effectivePrice')),
+        ]
+
+        if category:
+            querysets.append(
+                ('catalog: category, price range', catalog(f'category={category}&filter[maxPrice]=5000', 'effectivePrice'))
+            )
+
+        return querysets
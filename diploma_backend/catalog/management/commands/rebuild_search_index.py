@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Полностью перестраивает поисковый индекс товаров.
+    Нужен после массовых изменений в обход сигналов (bulk_create, update, raw SQL).
+    """
+
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt with {type(backend).__name__}.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from catalog.cache import bump_catalog_version
+from catalog.pricing import refresh_effective_prices
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает цену с учетом скидок у всех товаров.
+    Скидки начинаются и заканчиваются по датам без каких-либо изменений в БД,
+    поэтому команду нужно запускать по расписанию сразу после полуночи (например, cron `5 0 * * *`).
+    """
+
+    help = 'Recalculate Product.effectivePrice for sales that started or ended'
+
+    def handle(self, *args, **options):
+        updated = refresh_effective_prices()
+
+        # Изменилась сортировка и фильтрация каталога
+        if updated:
+            bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(f'Updated effective price of {updated} products.'))
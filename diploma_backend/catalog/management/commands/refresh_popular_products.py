@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from catalog.cache import bump_catalog_version
+from catalog.popularity import refresh_popular_products
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает рейтинг популярных товаров по продажам и отзывам с затуханием по времени.
+    Предназначена для запуска по расписанию (например, cron раз в час).
+    """
+
+    help = 'Recompute the materialized popular products ranking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=8, help='Number of products in the ranking')
+        parser.add_argument('--half-life-days', type=float, default=30, help='Days after which an event weighs half')
+        parser.add_argument('--review-weight', type=float, default=3, help='Score of one review relative to one sold item')
+
+    def handle(self, *args, **options):
+        ranked = refresh_popular_products(
+            top=options['top'],
+            half_life_days=options['half_life_days'],
+            review_weight=options['review_weight'],
+        )
+
+        bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(f'Ranked {ranked} popular products.'))
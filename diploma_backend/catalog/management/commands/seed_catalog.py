@@ -0,0 +1,78 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+
+from catalog.cache import bump_catalog_version
+from catalog.models import Category, Product, Tag
+from catalog.pricing import refresh_effective_prices
+from catalog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Наполняет каталог сгенерированными товарами.
+    Нужен для проверки планов запросов и индексов на большом объеме данных.
+    """
+
+    help = 'Fill the catalog with generated products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000, help='Number of products to create')
+        parser.add_argument('--categories', type=int, default=10, help='Number of categories to create')
+        parser.add_argument('--tags', type=int, default=20, help='Number of tags to create')
+        parser.add_argument('--tags-per-product', type=int, default=3, help='Number of tags for each product')
+        parser.add_argument('--batch-size', type=int, default=5_000, help='Rows per INSERT')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data')
+
+    @atomic
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        categories = Category.objects.bulk_create(
+            Category(title=f'Seed category {i}') for i in range(options['categories'])
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Seed tag {i}') for i in range(options['tags'])
+        )
+
+        products = Product.objects.bulk_create(
+            (
+                Product(
+                    title=f'Seed product {i}',
+                    description=f'Generated product number {i}',
+                    price=rnd.randint(100, 5_000_000) / 100,
+                    count=rnd.randint(0, 100),
+                    rating=rnd.randint(0, 50) / 10,
+                    freeDelivery=rnd.random() < 0.3,
+                    limited=rnd.random() < 0.05,
+                    sortIndex=rnd.randint(1, 10),
+                    sold=rnd.randint(0, 1_000),
+                    isDeleted=rnd.random() < 0.02,
+                    category=rnd.choice(categories),
+                )
+                for i in range(options['products'])
+            ),
+            batch_size=batch_size
+        )
+
+        tags_per_product = min(options['tags_per_product'], len(tags))
+        ProductTag = Product.tags.through
+        ProductTag.objects.bulk_create(
+            (
+                ProductTag(product_id=product.pk, tag_id=tag.pk)
+                for product in products
+                for tag in rnd.sample(tags, tags_per_product)
+            ),
+            batch_size=batch_size
+        )
+
+        # bulk_create не отправляет сигналы
+        get_search_backend().rebuild()
+        refresh_effective_prices()
+        bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(products)} products, {len(categories)} categories and {len(tags)} tags.'
+        ))
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_reviews_count(apps, schema_editor):
+    """ Заполняем счетчик отзывов для уже существующих товаров """
+    Product = apps.get_model('catalog', 'Product')
+    Reviews = apps.get_model('catalog', 'Reviews')
+
+    reviews_count = (
+        Reviews.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Product.objects.update(reviewsCount=Coalesce(Subquery(reviews_count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0028_alter_categoryimage_options_alter_product_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reviewsCount',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_reviews_count, migrations.RunPython.noop),
+    ]
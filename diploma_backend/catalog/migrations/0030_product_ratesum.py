@@ -0,0 +1,37 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:02
+
+from django.db import migrations, models
+from django.db.models import Sum, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_rate_sum(apps, schema_editor):
+    """ Заполняем сумму оценок для уже существующих товаров """
+    Product = apps.get_model('catalog', 'Product')
+    Reviews = apps.get_model('catalog', 'Reviews')
+
+    rate_sum = (
+        Reviews.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('rate'))
+        .values('total')
+    )
+    Product.objects.update(rateSum=Coalesce(Subquery(rate_sum), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0029_product_reviewscount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rateSum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rate_sum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0030_product_ratesum'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('isDeleted', False)), fields=['sortIndex', '-sold'], name='product_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('isDeleted', False), ('limited', True)), fields=['id'], name='product_limited_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('isDeleted', False)), fields=['category', 'price'], name='product_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('isDeleted', False)), fields=['price'], name='product_price_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Индекс полнотекстового поиска товаров.
+    SQLite - виртуальная таблица FTS5, PostgreSQL - GIN индекс по вектору названия и описания.
+    """
+
+    connection = schema_editor.connection
+
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE catalog_product_fts USING fts5('
+            'title, description, tags, tokenize = "unicode61 remove_diacritics 2")'
+        )
+        schema_editor.execute(
+            'INSERT INTO catalog_product_fts (rowid, title, description, tags) '
+            'SELECT p.id, p.title, p.description, COALESCE(('
+            'SELECT group_concat(t.name, \' \') FROM catalog_tag t '
+            'INNER JOIN catalog_product_tags pt ON pt.tag_id = t.id '
+            'WHERE pt.product_id = p.id'
+            '), \'\') FROM catalog_product p'
+        )
+
+    elif connection.vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+
+        Product = apps.get_model('catalog', 'Product')
+        schema_editor.add_index(
+            Product,
+            GinIndex(SearchVector('title', 'description', config='simple'), name='product_search_idx')
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS catalog_product_fts')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS product_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0031_product_product_popular_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
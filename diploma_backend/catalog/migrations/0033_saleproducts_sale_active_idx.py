@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0032_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='saleproducts',
+            index=models.Index(fields=['dateTo', 'dateFrom'], name='sale_active_idx'),
+        ),
+    ]
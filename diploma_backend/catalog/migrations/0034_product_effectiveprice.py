@@ -0,0 +1,52 @@
+# Generated by Django 5.1.5 on 2026-10-18 20:31
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def fill_effective_price(apps, schema_editor):
+    """ Заполняем цену с учетом действующих скидок для уже существующих товаров """
+    Product = apps.get_model('catalog', 'Product')
+    SaleProducts = apps.get_model('catalog', 'SaleProducts')
+
+    today = timezone.localdate()
+    sale_price = (
+        SaleProducts.objects
+        .filter(product=OuterRef('pk'), dateFrom__lte=today, dateTo__gte=today)
+        .values('salePrice')[:1]
+    )
+    Product.objects.update(effectivePrice=Coalesce(Subquery(sale_price), F('price')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0033_saleproducts_sale_active_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_price_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effectivePrice',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('isDeleted', False)), fields=['category', 'effectivePrice'], name='product_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('isDeleted', False)), fields=['effectivePrice'], name='product_price_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-18 20:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0034_product_effectiveprice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(unique=True)),
+                ('score', models.FloatField(default=0)),
+                ('computedAt', models.DateTimeField(auto_now_add=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='catalog.product')),
+            ],
+            options={
+                'verbose_name': 'Popular product',
+                'verbose_name_plural': 'Popular products',
+                'ordering': ['position'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0035_popularproduct'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reviews',
+            index=models.Index(fields=['product', '-date', '-id'], name='review_product_date_idx'),
+        ),
+    ]
@@ -110,13 +110,55 @@ class Product(models.Model):
         verbose_name_plural = 'Products'
         ordering = ['pk', 'title']
 
+        # Индексы под запросы каталога. Удаленные товары в выдачу не попадают,
+        # поэтому индексы частичные - только по актуальным товарам.
+        indexes = [
+            # Популярные товары: order_by('sortIndex', '-sold')
+            models.Index(
+                fields=['sortIndex', '-sold'],
+                condition=models.Q(isDeleted=False),
+                name='product_popular_idx'
+            ),
+            # Ограниченный тираж: limited=True
+            models.Index(
+                fields=['id'],
+                condition=models.Q(isDeleted=False, limited=True),
+                name='product_limited_idx'
+            ),
+            # Каталог категории с фильтром и сортировкой по цене (с учетом скидок)
+            models.Index(
+                fields=['category', 'effectivePrice'],
+                condition=models.Q(isDeleted=False),
+                name='product_category_price_idx'
+            ),
+            # Каталог без категории: фильтр и сортировка по цене (с учетом скидок)
+            models.Index(
+                fields=['effectivePrice'],
+                condition=models.Q(isDeleted=False),
+                name='product_price_idx'
+            ),
+        ]
+
     title = models.CharField(max_length=50, db_index=True)
     price = models.DecimalField(default=0, max_digits=8, decimal_places=2)
+
+    # Цена с учетом действующей скидки, по ней фильтрует и сортирует каталог.
+    # Поддерживается сигналами Product и SaleProducts и командой `refresh_effective_prices`
+    # на границах окон скидок (см. catalog.pricing).
+    effectivePrice = models.DecimalField(default=0, max_digits=8, decimal_places=2)
+
     count = models.IntegerField(default=0)
     date = models.DateTimeField(auto_now_add=True)
     description = models.CharField(max_length=100, blank=True, null=False)
     fullDescription = models.TextField(blank=True, null=False)
     rating = models.DecimalField(decimal_places=1, max_digits=2)
+
+    # Денормализованное кол-во отзывов и сумма их оценок.
+    # Поддерживаются сигналами модели Reviews, чтобы не считать отзывы на каждый товар в списках
+    # и пересчитывать рейтинг за O(1).
+    reviewsCount = models.PositiveIntegerField(default=0)
+    rateSum = models.PositiveIntegerField(default=0)
+
     freeDelivery = models.BooleanField(default=False)
 
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
@@ -184,6 +226,10 @@ class Reviews(models.Model):
         verbose_name = 'Review'
         verbose_name_plural = 'Reviews'
         ordering = ['pk', 'product']
+        indexes = [
+            # Отзывы товара постранично, новые первыми: order_by('-date', '-pk')
+            models.Index(fields=['product', '-date', '-id'], name='review_product_date_idx'),
+        ]
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews', db_index=True)
     author = models.CharField(max_length=40, db_index=True)
@@ -221,6 +267,10 @@ class SaleProducts(models.Model):
         verbose_name = 'Sale Product'
         verbose_name_plural = 'Sale Products'
         ordering = ['pk', 'product']
+        indexes = [
+            # Действующие скидки: dateFrom <= today <= dateTo
+            models.Index(fields=['dateTo', 'dateFrom'], name='sale_active_idx'),
+        ]
 
     product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='sales', db_index=True)
     salePrice = models.DecimalField(default=0, max_digits=8, decimal_places=2)
@@ -229,3 +279,24 @@ class SaleProducts(models.Model):
 
     def __str__(self):
         return f'Sale {self.pk}. Product {self.product.pk}'
+
+
+class PopularProduct(models.Model):
+    """
+    Рейтинг популярных товаров.
+
+    Пересчитывается по расписанию командой `refresh_popular_products` (см. catalog.popularity),
+    вкладка популярных товаров читает готовый рейтинг.
+    """
+    class Meta:
+        verbose_name = 'Popular product'
+        verbose_name_plural = 'Popular products'
+        ordering = ['position']
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='popularity')
+    position = models.PositiveIntegerField(unique=True)
+    score = models.FloatField(default=0)
+    computedAt = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.position}. Product {self.product.pk}'
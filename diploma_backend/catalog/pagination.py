@@ -0,0 +1,244 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Field, Q, QuerySet
+from django.utils.functional import cached_property
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .cache import get_cached_payload
+from .models import Product
+
+
+def estimate_catalog_count() -> int:
+    """
+    Оценка кол-ва товаров для широких фильтров.
+
+    Для PostgreSQL берется статистика планировщика (без сканирования таблицы),
+    для остальных БД - кэшируемое на долгий срок кол-во актуальных товаров.
+    """
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [Product._meta.db_table])
+            row = cursor.fetchone()
+
+        # До первого ANALYZE статистика может быть пустой
+        if row and row[0] > 0:
+            return int(row[0])
+
+    return get_cached_payload(
+        'count:estimated',
+        lambda: Product.objects.filter(isDeleted=False).count(),
+        timeout_name='estimatedCount'
+    )
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator с кэшированием общего кол-ва объектов.
+
+    count_key - ключ нормализованного набора фильтров, без него кол-во считается как обычно.
+    estimated - использовать оценку кол-ва вместо точного значения.
+    """
+
+    def __init__(self, *args, count_key: str | None = None, estimated: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_key = count_key
+        self.estimated = estimated
+
+    @cached_property
+    def count(self) -> int:
+        if self.estimated:
+            return estimate_catalog_count()
+
+        if self.count_key is None:
+            return Paginator.count.func(self)
+
+        return get_cached_payload(
+            f'count:{self.count_key}',
+            lambda: Paginator.count.func(self),
+            timeout_name='count'
+        )
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    Наследник `PageNumberPagination`
+    Переопределяет метод `get_paginated_response`
+    для получения валидного JSON
+    """
+
+    page_size = 4
+    page_query_param = 'currentPage'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    # Задаются представлением: ключ кэша кол-ва товаров и режим оценки кол-ва.
+    count_cache_key = None
+    estimate_count = False
+
+    def django_paginator_class(self, *args, **kwargs) -> CachedCountPaginator:
+        return CachedCountPaginator(
+            *args,
+            count_key=self.count_cache_key,
+            estimated=self.estimate_count,
+            **kwargs
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'currentPage': self.page.number,
+            'lastPage': self.page.paginator.num_pages,
+            'items': data
+        })
+
+
+def encode_cursor(position: dict) -> str:
+    """ Кодирует позицию в непрозрачную для клиента строку """
+    return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str, field: Field) -> dict:
+    """
+    Декодирует строку курсора и приводит значение поля сортировки к типу `field`.
+    При некорректном значении - 404 как у курсоров DRF.
+    """
+
+    try:
+        position = json.loads(urlsafe_b64decode(cursor.encode()))
+
+        page = position['page']
+        if not isinstance(page, int) or isinstance(page, bool) or page < 1:
+            raise ValueError
+
+        value = field.to_python(position['value'])
+        pk = int(position['pk'])
+
+        # Целые числа вне диапазона BIGINT не передать в БД
+        if value is None or any(isinstance(number, int) and abs(number) >= 2 ** 63 for number in (value, pk, page)):
+            raise ValueError
+
+        return {'value': value, 'pk': pk, 'page': page}
+    except (Base64Error, ValueError, TypeError, KeyError, OverflowError, DjangoValidationError):
+        raise NotFound('Invalid cursor')
+
+
+class CatalogKeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу (keyset) для каталога.
+
+    Позиция страницы - значение поля сортировки и pk последнего товара,
+    поэтому глубокие страницы не требуют OFFSET, а общее кол-во (COUNT) не считается.
+    Ответ совместим с `CatalogPagination`, `lastPage` всегда null,
+    а ссылка на следующую страницу передается в `nextCursor`.
+    """
+
+    page_size = 4
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    # Ограничение `limit`, чтобы один запрос не выгружал всю таблицу
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view=None) -> list:
+        self.page_size = self.get_page_size(request)
+
+        return self.paginate_cursor(queryset, request.query_params.get(self.cursor_query_param))
+
+    def paginate_cursor(self, queryset: QuerySet, cursor: str | None) -> list:
+        """ Возвращает страницу после позиции `cursor`, пустой курсор - первая страница """
+
+        # Поле сортировки берем из самого QuerySet, pk добавляем для однозначного порядка.
+        ordering = queryset.query.order_by[0] if queryset.query.order_by else 'pk'
+        self.field = ordering.lstrip('-')
+        self.descending = ordering.startswith('-')
+
+        if self.field == 'pk':
+            queryset = queryset.order_by(ordering)
+        else:
+            queryset = queryset.order_by(ordering, '-pk' if self.descending else 'pk')
+
+        position = decode_cursor(cursor, self._get_field(queryset)) if cursor else None
+
+        if position:
+            queryset = queryset.filter(self._after(position))
+            self.page_number = position['page'] + 1
+        else:
+            self.page_number = 1
+
+        # Берем на один объект больше, чтобы узнать о наличии следующей страницы.
+        items = list(queryset[:self.page_size + 1])
+        self.has_next = len(items) > self.page_size
+        items = items[:self.page_size]
+
+        self.last = items[-1] if items else None
+        return items
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def _get_field(self, queryset: QuerySet) -> Field:
+        """ Поле модели или аннотации, по которому идет сортировка """
+
+        if self.field == 'pk':
+            return queryset.model._meta.pk
+
+        if self.field in queryset.query.annotations:
+            return queryset.query.annotations[self.field].output_field
+
+        return queryset.model._meta.get_field(self.field)
+
+    def _after(self, position: dict) -> Q:
+        """ Условие "после последнего товара" с учетом направления сортировки """
+        lookup = 'lt' if self.descending else 'gt'
+
+        if self.field == 'pk':
+            return Q(**{f'pk__{lookup}': position['pk']})
+
+        return (
+            Q(**{f'{self.field}__{lookup}': position['value']})
+            | Q(**{self.field: position['value'], f'pk__{lookup}': position['pk']})
+        )
+
+    def get_next_cursor(self) -> str | None:
+        if not self.has_next:
+            return None
+
+        value = getattr(self.last, self.field)
+        return encode_cursor({
+            'value': value.isoformat() if hasattr(value, 'isoformat') else str(value),
+            'pk': self.last.pk,
+            'page': self.page_number,
+        })
+
+    def get_paginated_response(self, data):
+        return Response({
+            'currentPage': self.page_number,
+            'lastPage': None,
+            'nextCursor': self.get_next_cursor(),
+            'items': data
+        })
+
+
+class ReviewsKeysetPagination(CatalogKeysetPagination):
+    """
+    Постраничный вывод отзывов товара по ключу (date, pk), новые отзывы первыми.
+    Первая страница также встраивается в страницу товара (см. ProductFullSerializer).
+    """
+
+    page_size = 10
@@ -0,0 +1,94 @@
+import math
+from datetime import timedelta
+
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncDate
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from order.models import OrderItem
+from .models import Product, Reviews, PopularProduct
+
+
+def _decay(day, today, half_life_days: float) -> float:
+    """ Вес события давностью в (today - day) дней: каждые `half_life_days` дней вес уменьшается вдвое """
+    return 0.5 ** (max((today - day).days, 0) / half_life_days)
+
+
+def compute_popularity_scores(half_life_days: float = 30, review_weight: float = 3) -> dict[int, float]:
+    """
+    Считает очки популярности товаров с затуханием по времени.
+
+    Очки - кол-во проданных единиц товара (OrderItem оформленных заказов)
+    плюс `review_weight` за каждый отзыв, каждое событие с весом по его давности.
+    События старше четырех периодов полураспада (вес меньше 1/16) не учитываются.
+    Агрегация по дням выполняется в БД, в Python приходит по строке на товар и день.
+    Возвращает словарь {id товара: очки}.
+    """
+
+    today = timezone.localdate()
+    since = today - timedelta(days=math.ceil(half_life_days * 4))
+
+    scores = {}
+
+    sales = (
+        OrderItem.objects
+        .filter(order__isCreated=True, order__isDeleted=False, order__createdAt__date__gte=since)
+        .annotate(day=TruncDate('order__createdAt'))
+        .values('product_id', 'day')
+        .annotate(total=Sum('count'))
+        .values_list('product_id', 'day', 'total')
+        .order_by()
+    )
+    for product_id, day, total in sales.iterator():
+        scores[product_id] = scores.get(product_id, 0) + total * _decay(day, today, half_life_days)
+
+    reviews = (
+        Reviews.objects
+        .filter(date__gte=since)
+        .values('product_id', 'date')
+        .annotate(total=Count('pk'))
+        .values_list('product_id', 'date', 'total')
+        .order_by()
+    )
+    for product_id, day, total in reviews.iterator():
+        scores[product_id] = scores.get(product_id, 0) + review_weight * total * _decay(day, today, half_life_days)
+
+    return scores
+
+
+def refresh_popular_products(top: int = 8, half_life_days: float = 30, review_weight: float = 3) -> int:
+    """
+    Пересчитывает рейтинг популярных товаров и сохраняет первые `top` позиций в PopularProduct.
+
+    Порядок: sortIndex (ручная настройка, меньше - выше), затем очки популярности,
+    затем общее кол-во продаж. Кандидаты - товары с очками и первые `top` товаров
+    по (sortIndex, -sold), так что вся таблица товаров в Python не загружается.
+    Возвращает кол-во товаров в рейтинге.
+    """
+
+    scores = compute_popularity_scores(half_life_days, review_weight)
+
+    products = Product.objects.filter(isDeleted=False).only('pk', 'sortIndex', 'sold')
+    candidates = {}
+
+    # Товары с очками выбираются частями, чтобы не упереться в лимит параметров запроса
+    scored = list(scores)
+    for start in range(0, len(scored), 500):
+        candidates.update((product.pk, product) for product in products.filter(pk__in=scored[start:start + 500]))
+
+    candidates.update((product.pk, product) for product in products.order_by('sortIndex', '-sold')[:top])
+
+    ranking = sorted(
+        candidates.values(),
+        key=lambda product: (product.sortIndex, -scores.get(product.pk, 0), -product.sold, product.pk)
+    )[:top]
+
+    with atomic():
+        PopularProduct.objects.all().delete()
+        PopularProduct.objects.bulk_create(
+            PopularProduct(product=product, position=position, score=scores.get(product.pk, 0))
+            for position, product in enumerate(ranking, start=1)
+        )
+
+    return len(ranking)
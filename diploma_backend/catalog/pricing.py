@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, SaleProducts
+
+
+def effective_price_expression(today: date | None = None) -> Coalesce:
+    """
+    Выражение актуальной цены товара: цена действующей скидки (dateFrom <= today <= dateTo),
+    если она есть, иначе обычная цена.
+    """
+
+    if today is None:
+        today = timezone.localdate()
+
+    sale_price = (
+        SaleProducts.objects
+        .filter(product=OuterRef('pk'), dateFrom__lte=today, dateTo__gte=today)
+        .values('salePrice')[:1]
+    )
+
+    return Coalesce(Subquery(sale_price), F('price'))
+
+
+def refresh_effective_prices(product_ids=None) -> int:
+    """
+    Пересчитывает Product.effectivePrice.
+
+    Без `product_ids` пересчитываются все товары - так вызывается по расписанию
+    на границах окон скидок (команда `refresh_effective_prices`).
+    Обновляются только строки, у которых цена изменилась.
+    Возвращает кол-во обновленных товаров.
+    """
+
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+
+    price = effective_price_expression()
+
+    return products.exclude(effectivePrice=price).update(effectivePrice=price)
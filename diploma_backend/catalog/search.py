@@ -0,0 +1,214 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import QuerySet, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Product, Tag
+
+
+class BaseSearchBackend:
+    """
+    Базовый класс поиска товаров по названию, описанию и тегам.
+
+    filter - оставляет в QuerySet только найденные товары.
+    rank - дополнительно сортирует их по релевантности (поле `searchRank`).
+    index_products / remove_products / rebuild - поддержка индекса в актуальном состоянии.
+    """
+
+    def filter(self, queryset: QuerySet, query: str) -> QuerySet:
+        raise NotImplementedError
+
+    def rank(self, queryset: QuerySet, query: str) -> QuerySet:
+        return self.filter(queryset, query).order_by('pk')
+
+    def index_products(self, product_ids) -> None:
+        pass
+
+    def remove_products(self, product_ids) -> None:
+        pass
+
+    def rebuild(self) -> None:
+        pass
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """
+    Поиск через LIKE по названию. Не требует индекса, но сканирует всю таблицу.
+    """
+
+    def filter(self, queryset: QuerySet, query: str) -> QuerySet:
+        return queryset.filter(title__icontains=query)
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """
+    Полнотекстовый поиск через виртуальную таблицу FTS5.
+    Таблица создается миграцией, rowid совпадает с pk товара.
+    """
+
+    table = 'catalog_product_fts'
+
+    # Веса колонок для bm25: название важнее описания и тегов.
+    weights = (10.0, 2.0, 1.0)
+
+    @staticmethod
+    def _match_expression(query: str) -> str:
+        """
+        Преобразует пользовательский ввод в запрос FTS5.
+        Каждое слово экранируется и ищется по префиксу, все слова обязательны.
+        """
+
+        tokens = query.split()
+        return ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+    def filter(self, queryset: QuerySet, query: str) -> QuerySet:
+        match = self._match_expression(query)
+        if not match:
+            return queryset
+
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        )
+
+    def rank(self, queryset: QuerySet, query: str) -> QuerySet:
+        match = self._match_expression(query)
+        if not match:
+            return queryset.order_by('pk')
+
+        product_table = Product._meta.db_table
+        weights = ', '.join(str(weight) for weight in self.weights)
+
+        # bm25 возвращает тем меньшее значение, чем выше релевантность
+        return (
+            self.filter(queryset, query)
+            .annotate(searchRank=RawSQL(
+                f'SELECT bm25({self.table}, {weights}) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND rowid = "{product_table}"."id"',
+                [match],
+                output_field=FloatField()
+            ))
+            .order_by('searchRank', 'pk')
+        )
+
+    def index_products(self, product_ids) -> None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', product_ids)
+            cursor.execute(self._insert_sql(f'WHERE p.id IN ({placeholders})'), product_ids)
+
+    def remove_products(self, product_ids) -> None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', product_ids)
+
+    def rebuild(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(self._insert_sql())
+
+    def _insert_sql(self, where: str = '') -> str:
+        """ INSERT ... SELECT, собирающий название, описание и имена тегов товара """
+
+        product_table = Product._meta.db_table
+        tag_table = Tag._meta.db_table
+        through_table = Product.tags.through._meta.db_table
+
+        return (
+            f'INSERT INTO {self.table} (rowid, title, description, tags) '
+            f'SELECT p.id, p.title, p.description, COALESCE(('
+            f'SELECT group_concat(t.name, \' \') FROM {tag_table} t '
+            f'INNER JOIN {through_table} pt ON pt.tag_id = t.id '
+            f'WHERE pt.product_id = p.id'
+            f'), \'\') '
+            f'FROM {product_table} p {where}'
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Полнотекстовый поиск PostgreSQL.
+    Вектор строится по названию и описанию и совпадает с выражением GIN индекса из миграции,
+    теги ищутся по небольшой таблице тегов и индексу связей товар-тег.
+    Индекс поддерживается самой БД.
+    """
+
+    config = 'simple'
+
+    def _vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        return SearchVector('title', 'description', config=self.config)
+
+    def _query(self, query: str):
+        from django.contrib.postgres.search import SearchQuery
+
+        return SearchQuery(query, config=self.config, search_type='websearch')
+
+    def filter(self, queryset: QuerySet, query: str) -> QuerySet:
+        if not query.strip():
+            return queryset
+
+        from django.contrib.postgres.search import SearchVector
+
+        search_query = self._query(query)
+
+        # Два поиска, объединенные через UNION, а не OR EXISTS в одном условии:
+        # с OR планировщик не может использовать GIN индекс и сканирует всю таблицу.
+        matched = (
+            Product.objects
+            .annotate(searchVector=self._vector())
+            .filter(searchVector=search_query)
+            .order_by()
+            .values('pk')
+        )
+        tagged = (
+            Product.tags.through.objects
+            .annotate(tagVector=SearchVector('tag__name', config=self.config))
+            .filter(tagVector=search_query)
+            .order_by()
+            .values('product_id')
+        )
+
+        return queryset.filter(pk__in=matched.union(tagged))
+
+    def rank(self, queryset: QuerySet, query: str) -> QuerySet:
+        from django.contrib.postgres.search import SearchRank
+
+        if not query.strip():
+            return queryset.order_by('pk')
+
+        return (
+            self.filter(queryset, query)
+            .annotate(searchRank=SearchRank(self._vector(), self._query(query)))
+            .order_by('-searchRank', 'pk')
+        )
+
+
+@lru_cache(maxsize=None)
+def get_search_backend() -> BaseSearchBackend:
+    """
+    Возвращает бэкенд поиска.
+    Задается настройкой `CATALOG_SEARCH_BACKEND`, по умолчанию выбирается по используемой БД.
+    """
+
+    backend_path = getattr(settings, 'CATALOG_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+
+    return IcontainsSearchBackend()
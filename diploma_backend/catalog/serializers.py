@@ -8,7 +8,9 @@ from .models import (
     CategoryImage,
     Reviews,
     Specifications,
+    SaleProducts,
 )
+from .pagination import ReviewsKeysetPagination
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -86,7 +88,9 @@ class ProductShortSerializer(serializers.ModelSerializer):
 
     tags = TagSerializer(many=True)
     images = ProductImageSerializer(many=True)
-    reviews = serializers.SerializerMethodField()
+
+    # Кол-во отзывов берем из денормализованного поля, без запроса к отзывам.
+    reviews = serializers.IntegerField(source='reviewsCount', read_only=True)
 
     class Meta:
         model = Product
@@ -105,9 +109,6 @@ class ProductShortSerializer(serializers.ModelSerializer):
             'rating',
         )
 
-    def get_reviews(self, obj):
-        return obj.reviews.count()
-
 
 class ProductFullSerializer(serializers.ModelSerializer):
     """
@@ -117,9 +118,14 @@ class ProductFullSerializer(serializers.ModelSerializer):
 
     tags = TagSerializer(many=True)
     images = ProductImageSerializer(many=True)
-    reviews = ReviewsSerializer(many=True)
     specifications = SpecificationsSerializer(many=True)
 
+    # Только первая страница отзывов, остальные - по `reviewsNextCursor`
+    # через GET /api/product/<pk>/reviews?cursor=...
+    reviews = serializers.SerializerMethodField()
+    reviewsCount = serializers.IntegerField(read_only=True)
+    reviewsNextCursor = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
         fields = (
@@ -135,19 +141,60 @@ class ProductFullSerializer(serializers.ModelSerializer):
             'images',
             'tags',
             'reviews',
+            'reviewsCount',
+            'reviewsNextCursor',
             'specifications',
             'rating',
         )
 
+    def _get_reviews_page(self, obj) -> tuple[list, str | None]:
+        """
+        Функция для получения первой страницы отзывов (новые первыми) и курсора следующей.
+        Выполняет один запрос независимо от общего кол-ва отзывов.
+        """
+
+        if not hasattr(obj, '_reviews_page'):
+            paginator = ReviewsKeysetPagination()
+            page = paginator.paginate_cursor(obj.reviews.order_by('-date'), None)
+            obj._reviews_page = page, paginator.get_next_cursor()
+
+        return obj._reviews_page
+
+    def get_reviews(self, obj):
+        page, next_cursor = self._get_reviews_page(obj)
+        return ReviewsSerializer(page, many=True).data
+
+    def get_reviewsNextCursor(self, obj):
+        page, next_cursor = self._get_reviews_page(obj)
+        return next_cursor
+
 
 class SaleProductSerializer(serializers.ModelSerializer):
-    images = ProductImageSerializer(many=True)
+    """
+    Сериализатор скидки вместе с товаром для страницы распродажи.
+    Принимает QuerySet SaleProducts с many=True, товар и изображения должны быть предзагружены.
+    """
+
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    price = serializers.DecimalField(source='product.price', max_digits=8, decimal_places=2, read_only=True)
+    title = serializers.CharField(source='product.title', read_only=True)
+    images = ProductImageSerializer(source='product.images', many=True, read_only=True)
+
+    # Цена скидки отдается числом, как и раньше
+    salePrice = serializers.DecimalField(max_digits=8, decimal_places=2, coerce_to_string=False, read_only=True)
+
+    # Даты в формате месяц-день
+    dateFrom = serializers.DateField(format='%m-%d', read_only=True)
+    dateTo = serializers.DateField(format='%m-%d', read_only=True)
 
     class Meta:
-        model = Product
+        model = SaleProducts
         fields = (
             'id',
             'price',
+            'salePrice',
+            'dateFrom',
+            'dateTo',
             'title',
             'images'
         )
@@ -0,0 +1,203 @@
+from django.db import transaction
+from django.db.models import F, Value, Case, When, Count, Sum, FloatField, DecimalField
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import GreaterThan
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import (
+    Product,
+    Category,
+    Tag,
+    ProductImage,
+    CategoryImage,
+    Reviews,
+    Specifications,
+    SaleProducts
+)
+from .cache import bump_catalog_version, invalidate_product_on_commit
+from .pricing import refresh_effective_prices
+from .search import get_search_backend
+
+
+def _rating_expression(rate_sum, rate_count):
+    """
+    Выражение для среднего рейтинга, округленного до десятых.
+    Вычисляется на стороне БД, при отсутствии оценок рейтинг равен 0.
+    """
+
+    # Округляем один раз, промежуточное приведение к Decimal давало бы двойное округление.
+    rating_field = DecimalField(max_digits=2, decimal_places=1)
+    average = Cast(rate_sum, output_field=FloatField()) / rate_count
+
+    return Case(
+        When(GreaterThan(rate_count, 0), then=Round(average, 1, output_field=rating_field)),
+        default=Value(0),
+        output_field=rating_field
+    )
+
+
+@receiver(post_save, sender=Reviews)
+def update_rating_on_review_save(sender, instance: Reviews, created: bool, raw: bool, **kwargs):
+    """
+    Обновляет счетчики оценок и рейтинг товара при сохранении отзыва.
+    Срабатывает как для API, так и для инлайнов в админке.
+    При загрузке фикстур (raw) значения берутся из самой фикстуры.
+    """
+
+    if raw:
+        return
+
+    if created:
+        # В UPDATE все выражения видят старые значения строки,
+        # поэтому рейтинг считаем по уже увеличенным сумме и кол-ву.
+        Product.objects.filter(pk=instance.product_id).update(
+            reviewsCount=F('reviewsCount') + 1,
+            rateSum=F('rateSum') + instance.rate,
+            rating=_rating_expression(F('rateSum') + instance.rate, F('reviewsCount') + 1)
+        )
+    else:
+        # Изменение существующего отзыва (например, оценки в админке) - редкий случай,
+        # здесь допустим полный пересчет.
+        totals = Reviews.objects.filter(product=instance.product_id).aggregate(
+            count=Count('pk'), summ=Sum('rate')
+        )
+        Product.objects.filter(pk=instance.product_id).update(
+            reviewsCount=totals['count'],
+            rateSum=totals['summ'] or 0,
+            rating=_rating_expression(Value(totals['summ'] or 0), Value(totals['count']))
+        )
+
+
+@receiver(post_delete, sender=Reviews)
+def update_rating_on_review_delete(sender, instance: Reviews, **kwargs):
+    """
+    Уменьшает счетчики оценок и пересчитывает рейтинг товара при удалении отзыва.
+    """
+
+    Product.objects.filter(pk=instance.product_id, reviewsCount__gt=0).update(
+        reviewsCount=F('reviewsCount') - 1,
+        rateSum=F('rateSum') - instance.rate,
+        rating=_rating_expression(F('rateSum') - instance.rate, F('reviewsCount') - 1)
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_effective_price_on_product_save(sender, instance: Product, **kwargs):
+    """ Пересчитывает цену с учетом скидки при изменении цены товара """
+    refresh_effective_prices([instance.pk])
+
+
+@receiver(post_save, sender=SaleProducts)
+@receiver(post_delete, sender=SaleProducts)
+def update_effective_price_on_sale_change(sender, instance: SaleProducts, **kwargs):
+    """ Пересчитывает цену с учетом скидки при изменении скидки товара """
+    refresh_effective_prices([instance.product_id])
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Сбрасывает закэшированные ответы каталога при любом изменении его моделей.
+    Версия увеличивается после фиксации транзакции, иначе параллельный запрос
+    успел бы закэшировать еще не измененные данные под новой версией.
+    """
+
+    transaction.on_commit(bump_catalog_version)
+
+
+# Модели, изменения которых отражаются в закэшированных ответах каталога.
+for model in (Product, Category, Tag, ProductImage, CategoryImage, Reviews, SaleProducts):
+    post_save.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'catalog_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'catalog_cache_delete_{model.__name__}')
+
+m2m_changed.connect(invalidate_catalog_cache, sender=Product.tags.through, dispatch_uid='catalog_cache_product_tags')
+
+
+def invalidate_product_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает закэшированную страницу товара при изменении товара или связанных с ним объектов.
+    """
+
+    invalidate_product_on_commit(instance.pk if sender is Product else instance.product_id)
+
+
+# Модели, входящие в страницу товара.
+for model in (Product, ProductImage, Reviews, Specifications, SaleProducts):
+    post_save.connect(invalidate_product_cache, sender=model, dispatch_uid=f'product_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_product_cache, sender=model, dispatch_uid=f'product_cache_delete_{model.__name__}')
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_product_tags_cache(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    """ Сбрасывает страницы товаров при изменении их тегов """
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        invalidate_product_on_commit(instance.pk)
+    elif pk_set:
+        invalidate_product_on_commit(*pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def invalidate_tag_products_cache(sender, instance: Tag, created: bool, **kwargs):
+    """ Переименование тега отражается на страницах всех его товаров """
+    if not created:
+        invalidate_product_on_commit(*instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance: Product, **kwargs):
+    """ Обновляет товар в поисковом индексе """
+    get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance: Product, **kwargs):
+    """ Удаляет товар из поискового индекса """
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def index_product_tags(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    """
+    Обновляет теги товаров в поисковом индексе.
+    Изменение может прийти как со стороны товара, так и со стороны тега.
+    """
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        product_ids = [instance.pk]
+    elif pk_set:
+        product_ids = pk_set
+    else:
+        # post_clear со стороны тега не передает pk товаров
+        get_search_backend().rebuild()
+        return
+
+    get_search_backend().index_products(product_ids)
+
+
+@receiver(post_save, sender=Tag)
+def index_tag_products(sender, instance: Tag, created: bool, **kwargs):
+    """ Переименование тега отражается во всех его товарах """
+    if not created:
+        get_search_backend().index_products(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_products(sender, instance: Tag, **kwargs):
+    """ Запоминаем товары тега до удаления связей """
+    instance._indexed_product_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def index_deleted_tag_products(sender, instance: Tag, **kwargs):
+    """ Связи удаляются без m2m_changed, поэтому обновляем индекс и страницы товаров здесь """
+    product_ids = getattr(instance, '_indexed_product_ids', [])
+
+    get_search_backend().index_products(product_ids)
+    invalidate_product_on_commit(*product_ids)
@@ -1,3 +1,840 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_http_date, urlencode
+
+from order.models import Order, OrderItem
+from order.stock import reserve_order_stock
+from .cache import get_catalog_version, get_product_version, invalidate_product, set_cached_product
+from .filters import is_broad_filter, parse_catalog_filters
+from .models import Category, Product, ProductImage, SaleProducts, Tag, Reviews, PopularProduct
+from .pagination import encode_cursor
+from .search import get_search_backend, IcontainsSearchBackend, SQLiteFTSSearchBackend
+
+
+class BannersListViewTestCase(TestCase):
+    """
+    Баннеры должны строиться за фиксированное кол-во запросов,
+    независимо от кол-ва товаров в категориях.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(name='Tag')
+        cls.categories = [Category.objects.create(title=f'Category {i}') for i in range(4)]
+
+        # Удаленная категория не должна попадать в баннеры
+        cls.categories[0].isDeleted = True
+        cls.categories[0].save()
+
+    def setUp(self):
+        cache.clear()
+
+    def _fill_categories(self, products_per_category: int):
+        for category in self.categories:
+            for i in range(products_per_category):
+                product = Product.objects.create(
+                    title=f'Product {category.pk}-{i}',
+                    rating=0,
+                    category=category,
+                    # Первый товар каждой категории помечен удаленным
+                    isDeleted=(i == 0)
+                )
+                product.tags.add(self.tag)
+
+    def test_one_actual_product_per_category(self):
+        self._fill_categories(3)
+
+        response = self.client.get(reverse('catalog:catalog_banners'))
+        data = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['category'] for item in data],
+            [category.pk for category in self.categories[1:]]
+        )
+        self.assertTrue(all(item['title'].endswith('-1') for item in data))
+
+    def test_query_count_does_not_depend_on_products_count(self):
+        self._fill_categories(2)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('catalog:catalog_banners'))
+
+        cache.clear()
+        self._fill_categories(20)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('catalog:catalog_banners'))
+
+
+class SaleProductsListViewTestCase(TestCase):
+    """
+    Распродажа показывает только действующие скидки и строится за фиксированное кол-во запросов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        today = timezone.localdate()
+
+        cls.active = []
+        for i in range(6):
+            product = Product.objects.create(title=f'Product {i}', price=10, rating=0, category=category)
+            ProductImage.objects.create(product=product)
+            sale = SaleProducts.objects.create(product=product, salePrice=5, dateTo=today + timedelta(days=i))
+
+            # Каждая третья скидка уже закончилась
+            if i % 3 == 0:
+                SaleProducts.objects.filter(pk=sale.pk).update(
+                    dateFrom=today - timedelta(days=10),
+                    dateTo=today - timedelta(days=1),
+                )
+            else:
+                cls.active.append(product)
+
+    def test_only_active_sales(self):
+        data = self.client.get(reverse('catalog:catalog_sales'), {'limit': 20}).json()
+
+        self.assertEqual([item['id'] for item in data['items']], [product.pk for product in self.active])
+        self.assertEqual(data['items'][0]['salePrice'], 5)
+        self.assertEqual(data['items'][0]['dateFrom'], timezone.localdate().strftime('%m-%d'))
+        self.assertEqual(len(data['items'][0]['images']), 1)
+
+    def test_query_count(self):
+        # Кол-во, страница скидок с товарами, изображения
+        with self.assertNumQueries(3):
+            self.client.get(reverse('catalog:catalog_sales'))
+
+
+class EffectivePriceTestCase(TestCase):
+    """
+    Цена с учетом скидки поддерживается при изменении скидок и по расписанию.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=100, rating=0, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def _effective_price(self):
+        self.product.refresh_from_db()
+        return self.product.effectivePrice
+
+    def test_sale_changes(self):
+        self.assertEqual(self._effective_price(), 100)
+
+        sale = SaleProducts.objects.create(product=self.product, salePrice=60, dateTo=timezone.localdate())
+        self.assertEqual(self._effective_price(), 60)
+
+        sale.delete()
+        self.assertEqual(self._effective_price(), 100)
+
+    def test_catalog_filter_uses_sale_price(self):
+        SaleProducts.objects.create(product=self.product, salePrice=60, dateTo=timezone.localdate())
+
+        data = self.client.get(reverse('catalog:catalog_menu'), {'filter[maxPrice]': 70, 'sort': 'price', 'sortType': 'inc', 'limit': 20}).json()
+
+        self.assertEqual([item['id'] for item in data['items']], [self.product.pk])
+
+    def test_scheduled_refresh(self):
+        sale = SaleProducts.objects.create(product=self.product, salePrice=60, dateTo=timezone.localdate())
+
+        # Окно скидки закончилось без изменений в БД
+        SaleProducts.objects.filter(pk=sale.pk).update(dateTo=timezone.localdate() - timedelta(days=1))
+        self.assertEqual(self._effective_price(), 60)
+
+        call_command('refresh_effective_prices', stdout=StringIO())
+        self.assertEqual(self._effective_price(), 100)
+
+
+class PopularProductsTestCase(TestCase):
+    """
+    Популярные товары читаются из рассчитанного рейтинга, sortIndex остается ручной настройкой.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.products = [
+            Product.objects.create(title=f'Product {i}', price=10, rating=0, category=category)
+            for i in range(4)
+        ]
+
+        # Старые продажи весят меньше свежих
+        old_order = Order.objects.create(isCreated=True)
+        Order.objects.filter(pk=old_order.pk).update(createdAt=timezone.now() - timedelta(days=90))
+        OrderItem.objects.create(order=old_order, product=cls.products[0], count=10)
+
+        order = Order.objects.create(isCreated=True)
+        OrderItem.objects.create(order=order, product=cls.products[1], count=3)
+        OrderItem.objects.create(order=order, product=cls.products[2], count=1)
+
+        Reviews.objects.create(product=cls.products[2], author='Author', email='a@a.ru', rate=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def _popular_ids(self):
+        return [item['id'] for item in self.client.get(reverse('catalog:catalog_popular')).json()]
+
+    def test_ranking(self):
+        call_command('refresh_popular_products', top=3, stdout=StringIO())
+
+        self.assertEqual(
+            list(PopularProduct.objects.values_list('product_id', flat=True)),
+            [self.products[2].pk, self.products[1].pk, self.products[0].pk],
+        )
+        self.assertEqual(self._popular_ids(), [self.products[2].pk, self.products[1].pk, self.products[0].pk])
+
+    def test_sort_index_override(self):
+        Product.objects.filter(pk=self.products[2].pk).update(sortIndex=10)
+
+        call_command('refresh_popular_products', top=3, stdout=StringIO())
+
+        self.assertEqual(self._popular_ids(), [self.products[1].pk, self.products[0].pk, self.products[3].pk])
+
+    def test_query_count(self):
+        call_command('refresh_popular_products', stdout=StringIO())
+
+        # Товары рейтинга, теги, изображения
+        with self.assertNumQueries(3):
+            self.client.get(reverse('catalog:catalog_popular'))
+
+
+class ProductDetailCacheTestCase(TestCase):
+    """
+    Страница товара кэшируется, поддерживает условные запросы и сбрасывается при изменении товара.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=10, rating=0, category=category)
+        cls.other = Product.objects.create(title='Other', price=10, rating=0, category=category)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('catalog:catalog_product_detail', kwargs={'pk': self.product.pk})
+
+    def test_cached_and_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['title'], 'Product')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, headers={'If-Modified-Since': response['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_invalidation(self):
+        etag = self.client.get(self.url)['ETag']
+
+        # Изменение другого товара не сбрасывает страницу
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.title = 'Changed'
+            self.other.save()
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        # Страница сбрасывается только после фиксации транзакции
+        with self.captureOnCommitCallbacks(execute=True):
+            Reviews.objects.create(product=self.product, author='Author', email='a@a.ru', rate=5)
+            self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['reviews']), 1)
+
+    def test_late_write_is_not_served(self):
+        # Запрос прочитал товар до изменения, а записал в кэш уже после сброса
+        version = get_product_version(self.product.pk)
+        invalidate_product(self.product.pk)
+        set_cached_product(self.product.pk, version, {'title': 'Stale'})
+
+        self.assertEqual(self.client.get(self.url).json()['title'], 'Product')
+
+    def test_last_modified_increases_on_rebuild(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+
+        # Пересборка в ту же секунду не должна давать 304 по старому времени
+        invalidate_product(self.product.pk)
+        response = self.client.get(self.url, headers={'If-Modified-Since': last_modified})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(parse_http_date(response['Last-Modified']), parse_http_date(last_modified))
+
+    def test_tag_rename(self):
+        tag = Tag.objects.create(name='Tag')
+        self.product.tags.add(tag)
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = 'Renamed'
+            tag.save()
+
+        self.assertEqual([item['name'] for item in self.client.get(self.url).json()['tags']], ['Renamed'])
+
+    def test_stock_reservation(self):
+        Product.objects.filter(pk=self.product.pk).update(count=5)
+        self.client.get(self.url)
+
+        order = Order.objects.create(isCreated=True)
+        OrderItem.objects.create(order=order, product=self.product, count=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_order_stock(order.pk)
+
+        self.assertEqual(self.client.get(self.url).json()['count'], 3)
+
+
+class ProductReviewsTestCase(TestCase):
+    """
+    Отзывы выдаются постранично, страница товара содержит только первую страницу.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=10, rating=0, category=category)
+
+        Reviews.objects.bulk_create(
+            Reviews(product=cls.product, author=f'Author {i}', email='a@a.ru', rate=5)
+            for i in range(25)
+        )
+        # У части отзывов разные даты, у остальных порядок задает pk
+        Reviews.objects.filter(author__in=['Author 3', 'Author 7']).update(date=timezone.localdate() - timedelta(days=1))
+        Product.objects.filter(pk=cls.product.pk).update(reviewsCount=25)
+
+        cls.expected = list(Reviews.objects.order_by('-date', '-pk').values_list('author', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_keyset_pages(self):
+        url = reverse('catalog:catalog_product_detail_review', kwargs={'pk': self.product.pk})
+
+        authors = []
+        params = {'limit': 10}
+        while True:
+            data = self.client.get(url, params).json()
+            authors += [review['author'] for review in data['items']]
+            if not data['nextCursor']:
+                break
+            params['cursor'] = data['nextCursor']
+
+        self.assertEqual(authors, self.expected)
+
+    def test_detail_contains_first_page(self):
+        data = self.client.get(reverse('catalog:catalog_product_detail', kwargs={'pk': self.product.pk})).json()
+
+        self.assertEqual([review['author'] for review in data['reviews']], self.expected[:10])
+        self.assertEqual(data['reviewsCount'], 25)
+
+        # Курсор со страницы товара продолжает выдачу отзывов
+        url = reverse('catalog:catalog_product_detail_review', kwargs={'pk': self.product.pk})
+        page = self.client.get(url, {'cursor': data['reviewsNextCursor']}).json()
+        self.assertEqual([review['author'] for review in page['items']], self.expected[10:20])
+
+    def test_invalid_cursor(self):
+        url = reverse('catalog:catalog_product_detail_review', kwargs={'pk': self.product.pk})
+        cursors = [
+            'WzFd',
+            encode_cursor({'value': '2024-13-45', 'pk': 1, 'page': 1}),
+            encode_cursor({'value': timezone.localdate().isoformat(), 'page': 1}),
+        ]
+
+        # Отзывы доступны анонимным пользователям, некорректный курсор - 404, а не 500
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+
+
+class ReviewsCountTestCase(TestCase):
+    """
+    Счетчик отзывов товара поддерживается сигналами при создании и удалении отзывов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=10, rating=0, category=category)
+        cls.other = Product.objects.create(title='Other', price=10, rating=0, category=category)
+
+    def setUp(self):
+        cache.clear()
+
+    def _reviews_count(self, product):
+        product.refresh_from_db()
+        return product.reviewsCount
+
+    def test_create_and_delete(self):
+        reviews = [
+            Reviews.objects.create(product=self.product, author='Author', email='a@a.ru', rate=5)
+            for _ in range(3)
+        ]
+        self.assertEqual(self._reviews_count(self.product), 3)
+        self.assertEqual(self._reviews_count(self.other), 0)
+
+        reviews[0].delete()
+        self.assertEqual(self._reviews_count(self.product), 2)
+
+        Reviews.objects.filter(product=self.product).delete()
+        self.assertEqual(self._reviews_count(self.product), 0)
+
+    def test_catalog_sort_by_reviews(self):
+        Reviews.objects.create(product=self.other, author='Author', email='a@a.ru', rate=5)
+
+        data = self.client.get(reverse('catalog:catalog_menu'), {'sort': 'reviews', 'limit': 20}).json()
+
+        self.assertEqual([item['id'] for item in data['items']], [self.other.pk, self.product.pk])
+        self.assertEqual(data['items'][0]['reviews'], 1)
+
+
+class ProductRatingTestCase(TestCase):
+    """
+    Рейтинг товара пересчитывается одним UPDATE и округляется до десятых один раз.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=10, rating=0, category=category)
+
+    def _rating(self):
+        self.product.refresh_from_db()
+        return self.product.rating, self.product.rateSum, self.product.reviewsCount
+
+    def test_create_and_delete(self):
+        review = Reviews.objects.create(product=self.product, author='Author', email='a@a.ru', rate=5)
+        Reviews.objects.create(product=self.product, author='Author', email='a@a.ru', rate=4)
+        Reviews.objects.create(product=self.product, author='Author', email='a@a.ru', rate=4)
+        self.assertEqual(self._rating(), (Decimal('4.3'), 13, 3))
+
+        review.delete()
+        self.assertEqual(self._rating(), (Decimal('4.0'), 8, 2))
+
+        Reviews.objects.filter(product=self.product).delete()
+        self.assertEqual(self._rating(), (Decimal('0'), 0, 0))
+
+    def test_rounding_near_half(self):
+        # Среднее 4450 / 1000 = 4.45 округляется вверх
+        Product.objects.filter(pk=self.product.pk).update(rateSum=4445, reviewsCount=999)
+        Reviews.objects.create(product=self.product, author='Author', email='a@a.ru', rate=5)
+        self.assertEqual(self._rating()[0], Decimal('4.5'))
+
+        # Среднее 4449 / 1000 = 4.449 не должно округляться через 4.45
+        Product.objects.filter(pk=self.product.pk).update(rateSum=4444, reviewsCount=999)
+        Reviews.objects.create(product=self.product, author='Author', email='a@a.ru', rate=5)
+        self.assertEqual(self._rating()[0], Decimal('4.4'))
+
+    def test_post_only_new(self):
+        Reviews.objects.create(product=self.product, author='Old', email='a@a.ru', rate=3)
+        self.client.force_login(User.objects.create_user(username='user', password='password'))
+
+        url = reverse('catalog:catalog_product_detail_review', kwargs={'pk': self.product.pk})
+        review = {'author': 'New', 'email': 'a@a.ru', 'text': 'Text', 'rate': 5}
+
+        # Облегченный режим - только созданный отзыв, без списка
+        data = self.client.post(f'{url}?onlyNew=true', review, content_type='application/json').json()
+        self.assertIsInstance(data, dict)
+        self.assertEqual((data['author'], data['rate']), ('New', 5))
+
+        # Обычный режим - первая страница отзывов
+        data = self.client.post(url, review, content_type='application/json').json()
+        self.assertIsInstance(data, list)
+        self.assertEqual(len(data), 3)
+
+        self.assertEqual(self._rating(), (Decimal('4.3'), 13, 3))
+
+
+class CatalogCacheTestCase(TestCase):
+    """
+    Ответы главной страницы кэшируются и сбрасываются после фиксации изменений каталога.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.product = Product.objects.create(title='Product', price=10, count=5, rating=0, category=category)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached(self):
+        self.client.get(reverse('catalog:catalog_popular'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('catalog:catalog_popular'))
+        self.assertEqual([item['id'] for item in response.json()], [self.product.pk])
+
+    def test_version_bumped_after_commit(self):
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.title = 'Changed'
+            self.product.save()
+
+            # До фиксации транзакции версия не меняется
+            self.assertEqual(get_catalog_version(), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_stock_reservation_bumps_version(self):
+        self.client.get(reverse('catalog:catalog_popular'))
+        version = get_catalog_version()
+
+        order = Order.objects.create(isCreated=True)
+        OrderItem.objects.create(order=order, product=self.product, count=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(reserve_order_stock(order.pk))
+
+        self.assertGreater(get_catalog_version(), version)
+        response = self.client.get(reverse('catalog:catalog_popular'))
+        self.assertEqual(response.json()[0]['count'], 0)
+
+
+class CatalogKeysetPaginationTestCase(TestCase):
+    """
+    Постраничный вывод каталога по ключу проходит все товары без пропусков и повторов,
+    некорректный курсор дает 404.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+
+        # Повторяющиеся цены проверяют порядок по pk внутри одного значения
+        cls.products = [
+            Product.objects.create(title=f'Product {i}', price=10 + i % 3, rating=0, category=category)
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, **params):
+        return self.client.get(reverse('catalog:catalog_menu'), {'sort': 'price', 'sortType': 'inc', 'limit': 3, **params})
+
+    def test_round_trip(self):
+        expected = [
+            product.pk for product in sorted(self.products, key=lambda product: (product.price, product.pk))
+        ]
+
+        ids = []
+        pages = []
+        cursor = ''
+        while cursor is not None:
+            data = self._get(cursor=cursor).json()
+            ids += [item['id'] for item in data['items']]
+            pages.append(data['currentPage'])
+            cursor = data['nextCursor']
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, [1, 2, 3, 4])
+
+    def test_limit_is_capped(self):
+        category = self.products[0].category
+        Product.objects.bulk_create(
+            Product(title=f'Extra {i}', price=20, rating=0, category=category) for i in range(100)
+        )
+
+        data = self._get(cursor='', limit=10000000).json()
+        self.assertEqual(len(data['items']), 100)
+        self.assertIsNotNone(data['nextCursor'])
+
+        data = self._get(limit=10000000).json()
+        self.assertEqual(len(data['items']), 100)
+        self.assertEqual(data['lastPage'], 2)
+
+    def test_invalid_cursor(self):
+        cursors = [
+            '!!!',
+            encode_cursor([1]),
+            encode_cursor('value'),
+            encode_cursor({}),
+            encode_cursor({'pk': 1, 'page': 1}),
+            encode_cursor({'value': '10', 'page': 1}),
+            encode_cursor({'value': '10', 'pk': 1}),
+            encode_cursor({'value': '10', 'pk': 1, 'page': '1'}),
+            encode_cursor({'value': '10', 'pk': 'x', 'page': 1}),
+            encode_cursor({'value': 'abc', 'pk': 1, 'page': 1}),
+            encode_cursor({'value': None, 'pk': 1, 'page': 1}),
+            encode_cursor({'value': '10', 'pk': 2 ** 70, 'page': 1}),
+            encode_cursor({'value': '10', 'pk': float('inf'), 'page': 1}),
+        ]
+
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self._get(cursor=cursor).status_code, 404)
+
+    def test_invalid_date_cursor(self):
+        response = self._get(sort='date', cursor=encode_cursor({'value': '2024-13-45', 'pk': 1, 'page': 1}))
+
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogFiltersTestCase(TestCase):
+    """
+    Нормализация фильтров каталога и кэширование кол-ва товаров по набору фильтров.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.tags = [Tag.objects.create(name=f'Tag {i}') for i in range(2)]
+        cls.product = Product.objects.create(title='Смартфон Apple', price=10, rating=0, category=category)
+        cls.product.tags.add(*cls.tags)
+        Product.objects.create(title='Ноутбук', price=20, rating=0, category=category)
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, params):
+        return self.client.get(reverse('catalog:catalog_menu'), {'sort': 'price', 'limit': 20, **params}).json()
+
+    def test_same_filters_share_count(self):
+        self._get({'tags[]': [self.tags[0].pk, self.tags[1].pk], 'filter[minPrice]': '5'})
+
+        # Тот же набор фильтров в другом виде не считает кол-во повторно
+        with CaptureQueriesContext(connection) as context:
+            data = self._get({'tags[]': [self.tags[1].pk, self.tags[0].pk], 'filter[minPrice]': '5.00'})
+
+        self.assertFalse(any('COUNT' in query['sql'] for query in context.captured_queries))
+        self.assertEqual([item['id'] for item in data['items']], [self.product.pk])
+
+    def test_invalid_number(self):
+        for value in ('abc', 'NaN', 'Infinity', '-inf'):
+            with self.subTest(value=value):
+                response = self.client.get(reverse('catalog:catalog_menu'), {'sort': 'price', 'filter[minPrice]': value})
+                self.assertEqual(response.status_code, 400)
+
+    def test_estimated_count(self):
+        params = {'countMode': 'estimated', 'limit': 1}
+
+        # Без фильтров - оценка кол-ва всего каталога
+        data = self._get(params)
+        self.assertEqual(data['lastPage'], 2)
+        self.assertEqual(cache.get(f'catalog:count:estimated:{get_catalog_version()}'), 2)
+
+        # С фильтром по цене, доставке или наличию оценка не используется
+        for filters in ({'filter[minPrice]': 5, 'filter[maxPrice]': 15}, {'filter[available]': 'true'}):
+            with self.subTest(filters=filters):
+                self.assertFalse(is_broad_filter(parse_catalog_filters(QueryDict(urlencode(filters)))))
+
+        data = self._get({**params, 'filter[minPrice]': 5, 'filter[maxPrice]': 15})
+        self.assertEqual(data['lastPage'], 1)
+
+    @override_settings(CATALOG_SEARCH_BACKEND='catalog.search.IcontainsSearchBackend')
+    def test_cyrillic_title(self):
+        get_search_backend.cache_clear()
+        self.addCleanup(get_search_backend.cache_clear)
+
+        data = self._get({'filter[name]': 'Смартфон'})
+
+        self.assertEqual([item['id'] for item in data['items']], [self.product.pk])
+
+
+class CatalogIndexesTestCase(TestCase):
+    """
+    Запросы главной страницы и каталога используют частичные индексы (explain_catalog).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        for i in range(5):
+            Product.objects.create(title=f'Product {i}', price=10 * i, rating=0, category=category, limited=i % 2 == 0)
+
+    def test_explain(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Index names in plans are checked for SQLite only')
+
+        out = StringIO()
+        call_command('explain_catalog', stdout=out)
+        plans = out.getvalue()
+
+        for index in ('product_popular_idx', 'product_limited_idx', 'product_price_idx', 'product_category_price_idx'):
+            with self.subTest(index=index):
+                self.assertIn(index, plans)
+
+
+class SearchBackendTestCase(TestCase):
+    """
+    Выбор поискового бэкенда и поддержка индекса FTS5 в актуальном состоянии.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.tag = Tag.objects.create(name='Gaming')
+        cls.phone = Product.objects.create(title='Смартфон Galaxy', price=10, rating=0, category=category)
+        cls.laptop = Product.objects.create(title='Laptop Pro', price=20, rating=0, category=category)
+        cls.laptop.tags.add(cls.tag)
+
+    def setUp(self):
+        get_search_backend.cache_clear()
+        self.addCleanup(get_search_backend.cache_clear)
+
+    def _search(self, query: str) -> list:
+        return list(get_search_backend().filter(Product.objects.all(), query).values_list('pk', flat=True))
+
+    def test_backend_selection(self):
+        if connection.vendor == 'sqlite':
+            self.assertIsInstance(get_search_backend(), SQLiteFTSSearchBackend)
+
+        get_search_backend.cache_clear()
+        with override_settings(CATALOG_SEARCH_BACKEND='catalog.search.IcontainsSearchBackend'):
+            self.assertIsInstance(get_search_backend(), IcontainsSearchBackend)
+            self.assertEqual(self._search('Laptop'), [self.laptop.pk])
+
+    def test_fts_search(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 index is used on SQLite only')
+
+        # Префикс слова без учета регистра, в том числе для кириллицы
+        self.assertEqual(self._search('смарт'), [self.phone.pk])
+        self.assertEqual(self._search('lap PRO'), [self.laptop.pk])
+        self.assertEqual(self._search('gaming'), [self.laptop.pk])
+
+        # Индекс обновляется при изменении товара и переименовании тега
+        self.phone.title = 'Phone'
+        self.phone.save()
+        self.assertEqual(self._search('смарт'), [])
+
+        self.tag.name = 'Office'
+        self.tag.save()
+        self.assertEqual(self._search('gaming'), [])
+        self.assertEqual(self._search('office'), [self.laptop.pk])
+
+
+class CatalogTagsFilterTestCase(TestCase):
+    """
+    Фильтр по тегам не размножает товары с несколькими подходящими тегами.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.tags = [Tag.objects.create(name=f'Tag {i}') for i in range(3)]
+        cls.products = [
+            Product.objects.create(title=f'Product {i}', price=10 + i, rating=0, category=category)
+            for i in range(3)
+        ]
+        cls.products[0].tags.add(cls.tags[0], cls.tags[1])
+        cls.products[1].tags.add(cls.tags[1])
+        cls.products[2].tags.add(cls.tags[2])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_products_not_duplicated(self):
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(reverse('catalog:catalog_menu'), {
+                'sort': 'price', 'sortType': 'inc', 'limit': 20, 'tags[]': [self.tags[0].pk, self.tags[1].pk]
+            }).json()
+
+        self.assertEqual([item['id'] for item in data['items']], [self.products[0].pk, self.products[1].pk])
+        self.assertEqual(data['lastPage'], 1)
+        self.assertFalse(any('DISTINCT' in query['sql'] for query in context.captured_queries))
+
+
+class CatalogFacetsTestCase(TestCase):
+    """
+    Фасеты считаются по всем фильтрам, кроме своего измерения.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = [Category.objects.create(title=f'Category {i}') for i in range(2)]
+        cls.tags = [Tag.objects.create(name=f'Tag {i}') for i in range(2)]
+
+        cls.products = [
+            Product.objects.create(title='First', price=10, count=1, rating=0, category=cls.categories[0]),
+            Product.objects.create(title='Second', price=50, count=0, rating=0, category=cls.categories[0], freeDelivery=True),
+            Product.objects.create(title='Third', price=100, count=1, rating=0, category=cls.categories[1]),
+        ]
+        cls.products[0].tags.add(cls.tags[0])
+        cls.products[1].tags.add(cls.tags[0], cls.tags[1])
+        cls.products[2].tags.add(cls.tags[1])
+
+        # Удаленный товар не учитывается ни в одном фасете
+        Product.objects.create(title='Deleted', price=1000, count=1, rating=0, category=cls.categories[1], isDeleted=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def _facets(self, params: dict) -> dict:
+        return self.client.get(reverse('catalog:catalog_facets'), params).json()
+
+    def test_without_filters(self):
+        data = self._facets({})
+
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['price'], {'min': '10.00', 'max': '100.00'})
+        self.assertEqual(data['freeDelivery'], 1)
+        self.assertEqual(data['available'], 2)
+        self.assertEqual(data['categories'], [
+            {'id': self.categories[0].pk, 'count': 2},
+            {'id': self.categories[1].pk, 'count': 1},
+        ])
+        self.assertEqual(data['tags'], [
+            {'id': self.tags[0].pk, 'count': 2},
+            {'id': self.tags[1].pk, 'count': 2},
+        ])
+
+    def test_own_dimension_not_applied(self):
+        data = self._facets({
+            'category': self.categories[0].pk,
+            'filter[maxPrice]': 20,
+        })
+
+        # Под все фильтры попадает только первый товар
+        self.assertEqual(data['total'], 1)
+
+        # Цена - по всем товарам категории, без выбранного диапазона
+        self.assertEqual(data['price'], {'min': '10.00', 'max': '50.00'})
+
+        # Категории - по всем товарам в диапазоне цены, без выбранной категории
+        self.assertEqual(data['categories'], [{'id': self.categories[0].pk, 'count': 1}])
+
+        # Теги - по всем фильтрам
+        self.assertEqual(data['tags'], [{'id': self.tags[0].pk, 'count': 1}])
+
+    def test_tags_and_toggles(self):
+        data = self._facets({
+            'tags[]': [self.tags[1].pk],
+            'filter[available]': 'true',
+        })
+
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['tags'], [
+            {'id': self.tags[0].pk, 'count': 1},
+            {'id': self.tags[1].pk, 'count': 1},
+        ])
+        # Наличие считается без своего фильтра, бесплатная доставка - с ним
+        self.assertEqual(data['available'], 1)
+        self.assertEqual(data['freeDelivery'], 0)
+
+    def test_query_count(self):
+        with self.assertNumQueries(3):
+            self._facets({'category': self.categories[0].pk, 'tags[]': [self.tags[0].pk], 'filter[maxPrice]': 20})
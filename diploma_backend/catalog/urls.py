@@ -2,6 +2,7 @@ from django.urls import path
 
 from .views import (
     CatalogListView,
+    CatalogFacetsView,
     TagListView,
     CategoriesListView,
     BannersListView,
@@ -17,6 +18,7 @@ app_name = 'catalog'
 
 urlpatterns = [
     path('catalog', CatalogListView.as_view(), name='catalog_menu'),
+    path('catalog/facets', CatalogFacetsView.as_view(), name='catalog_facets'),
     path('tags', TagListView.as_view(), name='catalog_tags'),
     path('categories', CategoriesListView.as_view(), name='catalog_categories'),
     path('banners', BannersListView.as_view(), name='catalog_banners'),
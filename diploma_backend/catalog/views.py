@@ -1,13 +1,26 @@
-from django.db.models import Sum
+from django.db.models import F, Q, Window, QuerySet, Count, Min, Max
+from django.db.models.functions import RowNumber
+from django.db.transaction import atomic
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
 
 from rest_framework.request import Request
 from rest_framework.response import Response
 
 from rest_framework.views import APIView
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
-
-from .models import Product, Tag, Category, SaleProducts
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+
+from .models import Product, Tag, Category, SaleProducts, Reviews
+from .cache import get_cached_payload, get_cached_product, get_product_version, set_cached_product
+from .pagination import CatalogPagination, CatalogKeysetPagination, ReviewsKeysetPagination
+from .search import get_search_backend
+from .filters import (
+    parse_catalog_filters,
+    filter_catalog_queryset,
+    get_filter_conditions,
+    get_filters_key,
+    is_broad_filter
+)
 from .serializers import (
     ProductShortSerializer,
     ProductFullSerializer,
@@ -18,67 +31,59 @@ from .serializers import (
 )
 
 
-class CatalogPagination(PageNumberPagination):
-    """
-    Наследник `PageNumberPagination`
-    Переопределяет метод `get_paginated_response`
-    для получения валидного JSON
-    """
-
-    page_size = 4
-    page_query_param = 'currentPage'
-    def get_paginated_response(self, data):
-        return Response({
-            'currentPage': self.page.number,
-            'lastPage': self.page.paginator.num_pages,
-            'items': data
-        })
+# Соответствие параметра `sort` полю модели.
+# Неизвестные значения передаются как есть.
+CATALOG_SORT_FIELDS = {
+    'reviews': 'reviewsCount',
+    # Сортировка по цене с учетом действующих скидок
+    'price': 'effectivePrice',
+}
 
 
 class CatalogListView(APIView):
     def get(self, request: Request) -> Response:
         params = request.query_params
-        paginator = CatalogPagination()
+
+        # Постраничный вывод по ключу включается передачей `cursor` (пустой - первая страница).
+        # В этом режиме общее кол-во страниц не считается.
+        if 'cursor' in params:
+            paginator = CatalogKeysetPagination()
+        else:
+            paginator = CatalogPagination()
 
         # Основной вариант
+        # Кол-во объектов(товаров) на 1 странице передается в `limit` и ограничено `max_page_size` пагинатора.
         if params and params.get('format') is None:
-            # Кол-во объектов(товаров) на 1 странице
-            paginator.page_size = params.get('limit')
+            # Приводим фильтры к единому виду, он же служит ключом кэша кол-ва товаров.
+            filters = parse_catalog_filters(params)
 
-            products = (
+            # Поле сортировки. Отзывы сортируются по счетчику, а не по связанной таблице,
+            # цена - по цене с учетом скидок.
+            sort_field = CATALOG_SORT_FIELDS.get(params.get('sort'), params.get('sort'))
+
+            products = filter_catalog_queryset(
                 Product.objects
                 .select_related('category')
                 .prefetch_related('tags')
-                .prefetch_related('images')
-                .prefetch_related('reviews')
-                .filter(
-                    title__icontains=params.get('filter[name]'),
-                    price__range=(params.get('filter[minPrice]'), params.get('filter[maxPrice]')),
-                    isDeleted=False
-                )
-                .order_by(
-                    # Проверка направления сортировки
-                    params.get('sort') if params.get('sortType') == 'inc' else '-' + params.get('sort')
-                )
-                .defer('fullDescription', 'sortIndex', 'limited')
+                .prefetch_related('images'),
+                filters
             )
-            # Отдельная проверка бесплатной доставки
-            # Если передано false - будут выведены товары с бесплатной и платной.
-            if params.get('filter[freeDelivery]') == 'true':
-                products = products.filter(freeDelivery=True)
 
-            # Отдельная проверка на наличие
-            if params.get('filter[available]') == 'true':
-                products = products.filter(count__gt=0)
+            # Сортировка по релевантности доступна только при поиске по названию.
+            if sort_field == 'relevance' and filters['name']:
+                products = get_search_backend().rank(products, filters['name'])
+            else:
+                products = products.order_by(
+                    # Проверка направления сортировки
+                    sort_field if params.get('sortType') == 'inc' else '-' + sort_field
+                )
 
-            # Фильтрация по тегам. Товар должен включать хотя бы один из переданных.
-            # Без передачи тегов выводятся все товары
-            if params.getlist('tags[]', default=None):
-                products = products.filter(tags__in=params.getlist('tags[]')).distinct()
+            products = products.defer('fullDescription', 'sortIndex', 'limited')
 
-            # Соответствие товара выбранной категории
-            if params.get('category'):
-                products = products.filter(category=params.get('category'))
+            # Общее кол-во товаров кэшируется по набору фильтров.
+            # Для широких фильтров можно запросить оценку кол-ва (countMode=estimated).
+            paginator.count_cache_key = get_filters_key(filters)
+            paginator.estimate_count = params.get('countMode') == 'estimated' and is_broad_filter(filters)
 
         # Тестовый вариант для запроса в браузере без фильтров
         else:
@@ -86,7 +91,6 @@ class CatalogListView(APIView):
                 Product.objects
                 .select_related('category')
                 .prefetch_related('tags')
-                .prefetch_related('reviews')
                 .prefetch_related('images')
             )
 
@@ -95,55 +99,186 @@ class CatalogListView(APIView):
         return paginator.get_paginated_response(serialized.data)
 
 
+class CatalogFacetsView(APIView):
+    """
+    Кол-во товаров по тегам, категориям, наличию и бесплатной доставке,
+    а также границы цены для текущего набора фильтров каталога.
+    Фильтры разбираются так же, как в `CatalogListView`.
+
+    Каждый фасет считается по всем фильтрам, кроме своего измерения:
+    выбранная категория не скрывает кол-во по остальным категориям,
+    а границы цены не сужаются до уже выбранного диапазона.
+    """
+
+    def get(self, request: Request) -> Response:
+        filters = parse_catalog_filters(request.query_params)
+
+        return Response(get_cached_payload(
+            f'facets:{get_filters_key(filters)}',
+            lambda: self._count_facets(filters),
+            timeout_name='facets'
+        ))
+
+    def _count_facets(self, filters: dict) -> dict:
+        # Поиск по названию и удаленные товары - общая часть всех фасетов,
+        # остальные фильтры применяются к каждому фасету отдельно.
+        conditions = get_filter_conditions(filters)
+        products = filter_catalog_queryset(Product.objects.all(), filters, exclude=tuple(conditions)).order_by()
+
+        def without(dimension: str | None = None, extra: Q = Q()) -> Q:
+            """ Условия всех фильтров, кроме `dimension` """
+            condition = extra
+            for name, other in conditions.items():
+                if name != dimension:
+                    condition &= other
+
+            return condition
+
+        # Общие показатели считаются одним проходом по товарам.
+        summary = products.aggregate(
+            total=Count('pk', filter=without()),
+            minPrice=Min('effectivePrice', filter=without('price')),
+            maxPrice=Max('effectivePrice', filter=without('price')),
+            freeDelivery=Count('pk', filter=without('freeDelivery', Q(freeDelivery=True))),
+            available=Count('pk', filter=without('available', Q(count__gt=0))),
+        )
+
+        # Группировки по категориям и тегам
+        categories = (
+            products
+            .filter(without('category'))
+            .values('category')
+            .annotate(count=Count('pk'))
+            .order_by('category')
+        )
+        tags = (
+            Product.tags.through.objects
+            .filter(product__in=products.filter(without('tags')).values('pk'))
+            .values('tag')
+            .annotate(count=Count('product'))
+            .order_by('tag')
+        )
+
+        return {
+            'total': summary['total'],
+            # Цены в том же формате, что и в сериализаторах товаров
+            'price': {
+                'min': f'{summary["minPrice"]:.2f}' if summary['minPrice'] is not None else None,
+                'max': f'{summary["maxPrice"]:.2f}' if summary['maxPrice'] is not None else None,
+            },
+            'freeDelivery': summary['freeDelivery'],
+            'available': summary['available'],
+            'categories': [{'id': item['category'], 'count': item['count']} for item in categories],
+            'tags': [{'id': item['tag'], 'count': item['count']} for item in tags],
+        }
+
+
 class TagListView(APIView):
     def get(self, request: Request) -> Response:
+        return Response(get_cached_payload('tags', self._serialize))
+
+    def _serialize(self) -> list:
         tags = Tag.objects.all()
 
         serialized = TagSerializer(tags, many=True)
-        return Response(serialized.data)
+        return serialized.data
 
 
 class CategoriesListView(APIView):
     def get(self, request: Request) -> Response:
+        return Response(get_cached_payload('categories', self._serialize))
+
+    def _serialize(self) -> list:
         categories = Category.objects.select_related('image').filter(isDeleted=False)
         serialized = CategorySerializer(categories, many=True)
 
-        return Response(serialized.data)
+        return serialized.data
 
 
 class BannersListView(APIView):
     def get(self, request: Request) -> Response:
-        data = []
+        return Response(get_cached_payload('banners', self._serialize))
+
+    def get_queryset(self) -> QuerySet:
 
-        # Берем по одному товару из первых трех категорий в базе.
-        for category in Category.objects.prefetch_related('product_set').filter(isDeleted=False)[:3]:
-            serialized = ProductShortSerializer(category.product_set.first())
-            data.append(serialized.data)
+        # Берем по одному товару из первых трех категорий, в которых есть актуальные товары.
+        # Товар выбирается оконной функцией, поэтому кол-во запросов не зависит от размера категорий:
+        # один запрос на товары и по одному на теги и изображения.
+        products = (
+            Product.objects
+            .prefetch_related('tags')
+            .prefetch_related('images')
+            .annotate(
+                categoryPosition=Window(
+                    RowNumber(),
+                    partition_by=F('category'),
+                    order_by=(F('sortIndex').asc(), F('pk').asc())
+                )
+            )
+            .filter(isDeleted=False, category__isDeleted=False, categoryPosition=1)
+            .order_by('category')
+            .defer('fullDescription', 'sortIndex', 'limited')
+            [:3]
+        )
+
+        return products
+
+    def _serialize(self) -> list:
+        serialized = ProductShortSerializer(self.get_queryset(), many=True)
 
-        return Response(data)
+        return serialized.data
 
 
 class PopularListView(APIView):
     def get(self, request: Request) -> Response:
+        return Response(get_cached_payload('popular', self._serialize))
+
+    def get_queryset(self) -> QuerySet:
+        # Готовый рейтинг из PopularProduct (команда `refresh_popular_products`).
+        # sortIndex по-прежнему поднимает или опускает товар вручную.
+        products = (
+            Product.objects
+            .select_related('category')
+            .prefetch_related('tags')
+            .prefetch_related('images')
+            .filter(popularity__isnull=False, isDeleted=False)
+            .order_by('sortIndex', 'popularity__position')
+            .defer('fullDescription', 'sortIndex')
+            [:8]
+        )
+
+        return products
+
+    def get_fallback_queryset(self) -> QuerySet:
+        # Пока рейтинг не рассчитан - сортировка по общему кол-ву продаж
         products = (
             Product.objects
             .select_related('category')
             .prefetch_related('tags')
             .prefetch_related('images')
-            .prefetch_related('reviews')
             .order_by('sortIndex', '-sold')
             .defer('fullDescription', 'sortIndex')
             .filter(isDeleted=False)
             [:8]
         )
 
+        return products
+
+    def _serialize(self) -> list:
+        products = list(self.get_queryset())
+        if not products:
+            products = self.get_fallback_queryset()
+
         serialized = ProductShortSerializer(products, many=True)
 
-        return Response(serialized.data)
+        return serialized.data
 
 
 class LimitedListView(APIView):
     def get(self, request: Request) -> Response:
+        return Response(get_cached_payload('limited', self._serialize))
+
+    def get_queryset(self) -> QuerySet:
 
         # Первые 16 товаров с параметром limited=True
         products = (
@@ -151,101 +286,145 @@ class LimitedListView(APIView):
             .select_related('category')
             .prefetch_related('tags')
             .prefetch_related('images')
-            .prefetch_related('reviews')
             .filter(limited=True, isDeleted=False)
             .defer('fullDescription', 'sortIndex')
             [:16]
         )
 
-        serialized = ProductShortSerializer(products, many=True)
+        return products
 
-        return Response(serialized.data)
+    def _serialize(self) -> list:
+        serialized = ProductShortSerializer(self.get_queryset(), many=True)
+
+        return serialized.data
 
 
 class SaleProductsListView(APIView):
     def get(self, request: Request) -> Response:
         paginator = CatalogPagination()
-        data = []
 
+        # Только действующие скидки, окно дат проверяется в запросе (индекс sale_active_idx).
+        today = timezone.localdate()
         sales = (
             SaleProducts.objects
             .select_related('product')
             .prefetch_related('product__images')
-            .filter(product__isDeleted=False)
+            .filter(dateFrom__lte=today, dateTo__gte=today, product__isDeleted=False)
+            .only('product', 'salePrice', 'dateFrom', 'dateTo', 'product__price', 'product__title')
         )
         page = paginator.paginate_queryset(sales, request, view=self)
 
-        for discount in page:
+        # Страница сериализуется за один проход.
+        serialized = SaleProductSerializer(page, many=True)
 
-            # Сериализуем сам товар.
-            serialized = SaleProductSerializer(discount.product)
-            current_discount = serialized.data
+        return paginator.get_paginated_response(serialized.data)
 
-            # Дополняем получившийся словарь, указывая параметры скидки.
-            current_discount['salePrice'] = discount.salePrice
 
-            # Форматируем дату для получения валидного значения
-            current_discount['dateFrom'] = discount.dateFrom.strftime('%m-%d')
-            current_discount['dateTo'] = discount.dateTo.strftime('%m-%d')
+class ProductDetailView(APIView):
+    def get(self, request: Request, pk: int) -> Response:
 
-            data.append(current_discount)
+        # Страница товара кэшируется целиком и сбрасывается только при изменении этого товара.
+        # Версия берется до чтения из БД, чтобы не закэшировать товар, измененный во время запроса.
+        version = get_product_version(pk)
+        entry = get_cached_product(pk, version)
+
+        # Данные у клиента актуальны - отвечаем 304 без обращения к БД и сериализации.
+        if entry and self._is_not_modified(request, entry):
+            return self._with_validators(Response(status=304), entry)
+
+        if entry is None:
+            try:
+                product = (
+                    Product.objects
+                    .select_related('category')
+                    .prefetch_related('tags')
+                    .prefetch_related('images')
+                    .prefetch_related('specifications')
+                    .filter(isDeleted=False)
+                    .get(pk=pk)
+                )
+            except Product.DoesNotExist as e:
+                return Response({'message': f'Product with id: {pk} - not exists or deleted.'})
 
-        return paginator.get_paginated_response(data)
+            serialized = ProductFullSerializer(product)
+            entry = set_cached_product(pk, version, serialized.data)
 
+        return self._with_validators(Response(entry['payload']), entry)
 
-class ProductDetailView(APIView):
-    def get(self, request: Request, pk: int) -> Response:
-        try:
-            product = (
-                Product.objects
-                .select_related('category')
-                .prefetch_related('tags')
-                .prefetch_related('reviews')
-                .prefetch_related('images')
-                .prefetch_related('specifications')
-                .filter(isDeleted=False)
-                .get(pk=pk)
-            )
-        except Product.DoesNotExist as e:
-            return Response({'message': f'Product with id: {pk} - not exists or deleted.'})
+    @staticmethod
+    def _is_not_modified(request: Request, entry: dict) -> bool:
+        """ Проверка условного запроса по If-None-Match, а при его отсутствии - по If-Modified-Since """
 
-        serialized = ProductFullSerializer(product)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or entry['etag'] in etags
 
-        return Response(serialized.data)
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return if_modified_since is not None and if_modified_since >= entry['lastModified']
+
+    @staticmethod
+    def _with_validators(response: Response, entry: dict) -> Response:
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['lastModified'])
+
+        return response
 
 
 class ProductDetailReviewView(APIView):
-    # Только для авторизованных пользователей
-    permission_classes = [IsAuthenticated]
+    # Оставлять отзывы могут только авторизованные пользователи, читать - все
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request: Request, pk: int) -> Response:
+        """
+        Отзывы товара постранично по ключу (date, pk), новые первыми.
+        Следующая страница - по `nextCursor`, кол-во на странице - `limit`.
+        """
+
+        paginator = ReviewsKeysetPagination()
+
+        reviews = (
+            Reviews.objects
+            .filter(product_id=pk, product__isDeleted=False)
+            .order_by('-date')
+        )
+        page = paginator.paginate_queryset(reviews, request, view=self)
+
+        serialized = ReviewsSerializer(page, many=True)
+
+        return paginator.get_paginated_response(serialized.data)
 
+    # Отзыв и пересчет рейтинга должны выполняться в одной транзакции
+    @atomic
     def post(self, request: Request, pk: int) -> Response:
         try:
             product = (
                 Product.objects
-                .prefetch_related('reviews')
                 .filter(isDeleted=False)
-                .only('rating', 'reviews')
+                .only('pk')
                 .get(pk=pk)
             )
         except Product.DoesNotExist as e:
             return Response({'message': f'Product with id: {pk} - not exists or deleted.'})
 
-        product.reviews.create(
+        # Счетчики оценок и рейтинг товара обновляются сигналом одним UPDATE,
+        # поэтому стоимость записи не зависит от кол-ва отзывов.
+        review = product.reviews.create(
             author=request.data['author'],
             email=request.data['email'],
             text=request.data['text'],
             rate=request.data['rate']
         )
 
-        # Изменение рейтинга товара.
-        # Получаем кол-во оценок и их сумму.
-        rate_count = product.reviews.count()
-        rate_summ = product.reviews.aggregate(rate_summ=Sum('rate'))['rate_summ']
+        # Облегченный режим ответа - только созданный отзыв.
+        if request.query_params.get('onlyNew') == 'true':
+            serialized = ReviewsSerializer(review)
+            return Response(serialized.data)
 
-        # Присваиваем товару среднее арифметическое, что и является оценкой.
-        product.rating = round(rate_summ / rate_count, 1)
-        product.save()
+        # Первая страница отзывов, как на странице товара
+        paginator = ReviewsKeysetPagination()
+        page = paginator.paginate_cursor(product.reviews.order_by('-date'), None)
 
-        serialized = ReviewsSerializer(product.reviews, many=True)
+        serialized = ReviewsSerializer(page, many=True)
 
         return Response(serialized.data)
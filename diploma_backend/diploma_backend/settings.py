@@ -90,6 +90,57 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Кэш ответов каталога. Можно указать любой алиас из CACHES (например, Redis).
+CATALOG_CACHE_ALIAS = 'default'
+
+# Время жизни ответов каталога по endpoint'ам, в секундах.
+CATALOG_CACHE_TIMEOUTS = {
+    'banners': 60 * 5,
+    'popular': 60 * 5,
+    'limited': 60 * 5,
+    'tags': 60 * 30,
+    'categories': 60 * 30,
+    # Общее кол-во товаров для постраничного вывода каталога
+    'count': 30,
+    'estimatedCount': 60 * 10,
+    # Кол-во товаров по фильтрам боковой панели каталога
+    'facets': 60,
+    # Страница товара, сбрасывается при изменении товара
+    'product': 60 * 30,
+}
+
+# Поиск товаров. По умолчанию бэкенд выбирается по БД:
+# SQLite - FTS5, PostgreSQL - полнотекстовый поиск с GIN индексом.
+# Можно указать путь к классу, например 'catalog.search.IcontainsSearchBackend'.
+CATALOG_SEARCH_BACKEND = None
+
+# Хранилище корзин анонимных пользователей, по умолчанию - БД.
+# 'basket.storage.CacheBasketStorage' хранит корзины в кэше до входа пользователя.
+# Для него нужен отдельный общий для всех процессов кэш без вытеснения записей (например, Redis),
+# а не кэш каталога:
+# CACHES['baskets'] = {
+#     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#     'LOCATION': 'redis://127.0.0.1:6379/1',
+# }
+BASKET_ANONYMOUS_STORAGE = 'basket.storage.DatabaseBasketStorage'
+BASKET_CACHE_ALIAS = 'baskets'
+# Совпадает со сроком жизни куки `basket_key` - неделя.
+BASKET_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Время в минутах, в течение которого товары подтвержденного заказа зарезервированы до оплаты.
+# Истекшие резервы снимает команда `release_reservations`.
+ORDER_RESERVATION_TIMEOUT = 30
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -82,7 +82,8 @@ class OrderItemAdmin(admin.ModelAdmin):
         'pk',
         'order',
         'product',
-        'count'
+        'count',
+        'price'
     )
     list_display_links = (
         'pk',
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from order.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    """
+    Возвращает на склад товары неоплаченных заказов с истекшим резервом.
+    Предназначена для запуска по расписанию (например, cron каждые несколько минут).
+    """
+
+    help = 'Release stock reserved by orders that were not paid in time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=None, help='Reservation timeout, ORDER_RESERVATION_TIMEOUT by default')
+        parser.add_argument('--batch-size', type=int, default=100, help='Orders fetched per batch')
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(
+            minutes=options['minutes'],
+            batch_size=options['batch_size'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'Released {released} order reservations.'))
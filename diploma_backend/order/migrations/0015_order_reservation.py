@@ -0,0 +1,27 @@
+# Generated by Django 5.1.5 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0014_alter_order_options_alter_orderitem_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='isReserved',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='reservedAt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('isPayed', False), ('isReserved', True)), fields=['reservedAt'], name='order_reserved_idx'),
+        ),
+    ]
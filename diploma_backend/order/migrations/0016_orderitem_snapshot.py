@@ -0,0 +1,57 @@
+# Generated by Django 5.1.5 on 2026-10-18 20:29
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_order_items_snapshot(apps, schema_editor):
+    """
+    Заполняем снимок товара для уже существующих заказов.
+    Цена покупки не сохранялась, поэтому берется текущая цена товара.
+    """
+    OrderItem = apps.get_model('order', 'OrderItem')
+    Product = apps.get_model('catalog', 'Product')
+    ProductImage = apps.get_model('catalog', 'ProductImage')
+
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    image = ProductImage.objects.filter(product=OuterRef('product_id')).order_by('pk')
+
+    OrderItem.objects.update(
+        price=Subquery(product.values('price')[:1]),
+        title=Subquery(product.values('title')[:1]),
+        description=Subquery(product.values('description')[:1]),
+        imageSrc=Coalesce(Subquery(image.values('src')[:1]), models.Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0025_alter_saleproducts_product'),
+        ('order', '0015_order_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='description',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='imageSrc',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='title',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.RunPython(fill_order_items_snapshot, migrations.RunPython.noop),
+    ]
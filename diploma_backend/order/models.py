@@ -19,6 +19,14 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=True)
     count = models.PositiveIntegerField(default=1)
 
+    # Снимок товара на момент оформления заказа.
+    # История заказов читается только из этих полей, без обращения к таблицам каталога,
+    # а цена остается той, по которой товар был куплен.
+    price = models.DecimalField(default=0, max_digits=8, decimal_places=2)
+    title = models.CharField(max_length=50, blank=True)
+    description = models.CharField(max_length=100, blank=True)
+    imageSrc = models.CharField(max_length=100, blank=True) # Путь к основному изображению товара в MEDIA
+
     def __str__(self):
         return f'Order item {self.pk}. Order {self.order.pk}'
 
@@ -32,6 +40,14 @@ class Order(models.Model):
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
         ordering = ['pk', 'user']
+        indexes = [
+            # Поиск неоплаченных заказов с истекшим резервом (см. order.stock.release_expired_reservations)
+            models.Index(
+                fields=['reservedAt'],
+                name='order_reserved_idx',
+                condition=models.Q(isReserved=True, isPayed=False),
+            ),
+        ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order', blank=True, null=True, db_index=True)
     createdAt = models.DateTimeField(auto_now_add=True)
@@ -51,6 +67,11 @@ class Order(models.Model):
 
     isPayed = models.BooleanField(default=False)
 
+    # Товары заказа зарезервированы на складе: списаны из Product.count и учтены в Product.sold.
+    # Резерв неоплаченного заказа снимается по истечении ORDER_RESERVATION_TIMEOUT.
+    isReserved = models.BooleanField(default=False)
+    reservedAt = models.DateTimeField(null=True, blank=True)
+
     # Вспомогательное поле, служит для проверки того, что заказ на стадии формирования.
     isCreated = models.BooleanField(default=False)
 
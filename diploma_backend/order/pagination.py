@@ -0,0 +1,10 @@
+from catalog.pagination import CatalogKeysetPagination
+
+
+class OrderHistoryPagination(CatalogKeysetPagination):
+    """
+    Постраничный вывод истории заказов по ключу (createdAt, pk), новые заказы первыми.
+    Формат ответа совпадает с постраничным каталогом, следующая страница - по `nextCursor`.
+    """
+
+    page_size = 10
@@ -1,40 +1,47 @@
-from rest_framework import serializers
+from django.core.files.storage import default_storage
+from django.db.models import QuerySet
 
-from .models import Order
-from catalog.models import Product
+from rest_framework import serializers
 
-# Берем готовый сериализатор
-from catalog.serializers import ProductShortSerializer
+from .models import Order, OrderItem
 
 
-# Наследуемся от сериализатора товаров и редактируем поля
-class _OrderProductSerializer(ProductShortSerializer):
+class OrderItemSerializer(serializers.ModelSerializer):
     """
-    Вспомогательный класс для сериализации товаров в ходе сериализации самого заказа.
+    Сериализатор товара в заказе.
+
+    Данные берутся из снимка товара в OrderItem, без обращения к таблицам каталога.
+    Формат совпадает с товаром каталога в части, используемой страницами заказа.
     """
 
-    # Все необходимые поля за исключением count,
-    # оно будет добавлено из OrderItem
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    images = serializers.SerializerMethodField()
+
     class Meta:
-        model = Product
+        model = OrderItem
         fields = (
             'id',
-            'category',
             'price',
-            'date',
+            'count',
             'title',
             'description',
-            'freeDelivery',
             'images',
-            'tags',
-            'reviews',
-            'rating',
         )
 
+    def get_images(self, obj):
+        """
+        Функция для представления сохраненного изображения в формате изображений товара.
+        """
+
+        if not obj.imageSrc:
+            return []
+
+        return [{'src': default_storage.url(obj.imageSrc), 'alt': obj.title}]
+
 
 class OrderSerializer(serializers.ModelSerializer):
     createdAt = serializers.SerializerMethodField()
-    products = serializers.SerializerMethodField()
+    products = OrderItemSerializer(source='orderitem_set', many=True, read_only=True)
 
     class Meta:
         model = Order
@@ -53,38 +60,20 @@ class OrderSerializer(serializers.ModelSerializer):
             'products'
         )
 
-    def get_createdAt(self, obj):
+    @staticmethod
+    def setup_eager_loading(queryset: QuerySet) -> QuerySet:
         """
-        Функция для преобразования даты в удобный формат из ISO 8601
+        Добавляет к QuerySet заказов предзагрузку товаров заказа.
+
+        Товары сериализуются из снимка в OrderItem, поэтому сериализация выполняется
+        за два запроса (заказы и их товары) независимо от кол-ва заказов и товаров в них.
         """
 
-        return obj.createdAt.strftime('%Y-%m-%d %H.%M.%S')
+        return queryset.prefetch_related('orderitem_set')
 
-    def get_products(self, obj):
+    def get_createdAt(self, obj):
         """
-        Фукнция для сериализации каждого товара в заказе.
-
-        Работает с объектом Order и промежуточной моделью OrderItem.
-        Возвращает сериализованый товар с кол-вом его в заказе.
+        Функция для преобразования даты в удобный формат из ISO 8601
         """
 
-        data = []
-        for order_item in (
-            # Оптимизируем запрос
-            obj.orderitem_set
-            .prefetch_related('product')
-            .select_related('product__category')
-            .prefetch_related('product__tags')
-            .prefetch_related('product__images')
-            .prefetch_related('product__reviews')
-            .defer('product__count')
-        ):
-            serialized = _OrderProductSerializer(order_item.product)
-
-            # Добавляем в data ключ count, перед этим копируем словарь из сериализатора
-            serialized_data_with_count = serialized.data
-            serialized_data_with_count['count'] = order_item.count
-
-            data.append(serialized_data_with_count)
-
-        return data
+        return obj.createdAt.strftime('%Y-%m-%d %H.%M.%S')
@@ -0,0 +1,137 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.transaction import atomic, on_commit
+from django.utils import timezone
+
+from catalog.cache import bump_catalog_version, invalidate_product_on_commit
+from catalog.models import Product
+from .models import Order, OrderItem
+
+
+class _NotEnoughStock(Exception):
+    """ Прерывает транзакцию резервирования, если какого-то товара не хватает """
+
+
+def _get_order_lines(order_id: int) -> dict[int, int]:
+    """ Возвращает товары заказа в виде {id товара: кол-во} """
+
+    return dict(
+        OrderItem.objects
+        .filter(order_id=order_id)
+        .values('product_id')
+        .annotate(total=Sum('count'))
+        .values_list('product_id', 'total')
+    )
+
+
+def _line_count(lines: dict[int, int]) -> Case:
+    """ Кол-во товара в заказе для текущей строки UPDATE """
+
+    return Case(
+        *[When(pk=product_id, then=Value(count)) for product_id, count in lines.items()],
+        output_field=IntegerField(),
+    )
+
+
+def reserve_order_stock(order_id: int) -> bool:
+    """
+    Резервирует товары заказа на складе.
+
+    Все товары списываются одним условным запросом
+    UPDATE product SET count = count - n, sold = sold + n WHERE count >= n,
+    поэтому одновременные оформления не уходят в минус.
+    Если хотя бы одного товара не хватает - транзакция откатывается и возвращается False.
+    Повторный вызов для уже зарезервированного заказа ничего не делает.
+    """
+
+    try:
+        with atomic():
+            # Помечаем заказ первым: блокировка строки заказа не дает зарезервировать его дважды.
+            reserved = (
+                Order.objects
+                .filter(pk=order_id, isReserved=False)
+                .update(isReserved=True, reservedAt=timezone.now())
+            )
+            if not reserved:
+                return True
+
+            lines = _get_order_lines(order_id)
+            if not lines:
+                return True
+
+            line_count = _line_count(lines)
+            updated = (
+                Product.objects
+                .filter(pk__in=lines, isDeleted=False, count__gte=line_count)
+                .update(count=F('count') - line_count, sold=F('sold') + line_count)
+            )
+            if updated != len(lines):
+                raise _NotEnoughStock
+
+            # Остатки и продажи входят в закэшированные ответы каталога и страницы товаров
+            on_commit(bump_catalog_version)
+            invalidate_product_on_commit(*lines)
+
+    except _NotEnoughStock:
+        return False
+
+    return True
+
+
+def release_order_stock(order_id: int) -> bool:
+    """
+    Снимает резерв с неоплаченного заказа и возвращает товары на склад.
+    Возвращает False, если резерва не было.
+    """
+
+    with atomic():
+        released = (
+            Order.objects
+            .filter(pk=order_id, isReserved=True, isPayed=False)
+            .update(isReserved=False, reservedAt=None)
+        )
+        if not released:
+            return False
+
+        lines = _get_order_lines(order_id)
+        if lines:
+            line_count = _line_count(lines)
+            Product.objects.filter(pk__in=lines).update(count=F('count') + line_count, sold=F('sold') - line_count)
+            on_commit(bump_catalog_version)
+            invalidate_product_on_commit(*lines)
+
+    return True
+
+
+def release_expired_reservations(minutes: int | None = None, batch_size: int = 100) -> int:
+    """
+    Снимает резерв с заказов, не оплаченных за `minutes` минут
+    (по умолчанию настройка ORDER_RESERVATION_TIMEOUT).
+
+    Можно вызывать из планировщика (cron, celery beat и т.п.) или командой `release_reservations`.
+    Возвращает кол-во заказов, с которых снят резерв.
+    """
+
+    if minutes is None:
+        minutes = getattr(settings, 'ORDER_RESERVATION_TIMEOUT', 30)
+
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    expired = (
+        Order.objects
+        .filter(isReserved=True, isPayed=False, reservedAt__lt=cutoff)
+        .order_by('reservedAt')
+        .values_list('pk', flat=True)
+    )
+
+    released = 0
+    while True:
+        order_ids = list(expired[:batch_size])
+        if not order_ids:
+            break
+
+        for order_id in order_ids:
+            released += release_order_stock(order_id)
+
+    return released
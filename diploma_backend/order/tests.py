@@ -1,3 +1,272 @@
-from django.test import TestCase
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Category, Product, ProductImage, SaleProducts, Tag
+from catalog.pagination import encode_cursor
+from .models import Order, OrderItem
+from .serializers import OrderSerializer
+from .stock import reserve_order_stock, release_expired_reservations
+
+
+class OrderCreateTestCase(TestCase):
+    """
+    Заказ создается за фиксированное кол-во запросов, стоимость считается на сервере.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.products = [
+            Product.objects.create(title=f'Product {i}', price=Decimal('10.50'), count=100, rating=0, category=category)
+            for i in range(20)
+        ]
+
+        today = timezone.localdate()
+        SaleProducts.objects.create(product=cls.products[0], salePrice=Decimal('5.25'), dateTo=today)
+        # Скидка уже закончилась
+        expired = SaleProducts.objects.create(product=cls.products[1], salePrice=1, dateTo=today)
+        SaleProducts.objects.filter(pk=expired.pk).update(dateFrom=today - timedelta(days=10), dateTo=today - timedelta(days=1))
+
+    def _post(self, lines):
+        return self.client.post(reverse('order:order_history'), lines, content_type='application/json')
+
+    def test_total_cost_uses_server_prices(self):
+        response = self._post([
+            {'id': self.products[0].pk, 'count': 2, 'price': 0},
+            {'id': self.products[1].pk, 'count': 1, 'price': 0},
+            {'id': self.products[0].pk, 'count': 1, 'price': 0},
+        ])
+
+        order = Order.objects.get(pk=response.json()['orderId'])
+        self.assertEqual(order.totalCost, Decimal('5.25') * 3 + Decimal('10.50'))
+        self.assertEqual(
+            sorted(order.orderitem_set.values_list('product_id', 'count')),
+            [(self.products[0].pk, 3), (self.products[1].pk, 1)],
+        )
+
+    def test_unknown_product(self):
+        response = self._post([{'id': 0, 'count': 1}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_does_not_grow(self):
+        queries = []
+        for items_count in (1, 20):
+            with CaptureQueriesContext(connection) as context:
+                self._post([{'id': product.pk, 'count': 1} for product in self.products[:items_count]])
+            queries.append(len(context))
+
+        self.assertEqual(queries[0], queries[1])
+
+
+class StockReservationTestCase(TestCase):
+    """
+    Резерв товаров списывает остаток целиком либо не списывает ничего.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        cls.first = Product.objects.create(title='First', price=10, count=5, rating=0, category=category)
+        cls.second = Product.objects.create(title='Second', price=10, count=1, rating=0, category=category)
+
+    def _create_order(self, first_count, second_count) -> Order:
+        order = Order.objects.create()
+        OrderItem.objects.create(order=order, product=self.first, count=first_count)
+        OrderItem.objects.create(order=order, product=self.second, count=second_count)
+        return order
+
+    def _stock(self):
+        return list(Product.objects.order_by('pk').values_list('count', 'sold'))
+
+    def test_reserve(self):
+        order = self._create_order(3, 1)
+
+        self.assertTrue(reserve_order_stock(order.pk))
+        # Повторный вызов не списывает товары второй раз
+        self.assertTrue(reserve_order_stock(order.pk))
+
+        self.assertEqual(self._stock(), [(2, 3), (0, 1)])
+
+    def test_not_enough_stock_rolls_back(self):
+        order = self._create_order(3, 2)
+
+        self.assertFalse(reserve_order_stock(order.pk))
+
+        self.assertEqual(self._stock(), [(5, 0), (1, 0)])
+        self.assertFalse(Order.objects.get(pk=order.pk).isReserved)
+
+    def test_release_expired(self):
+        expired = self._create_order(3, 1)
+        paid = self._create_order(1, 0)
+        reserve_order_stock(expired.pk)
+        reserve_order_stock(paid.pk)
+        Order.objects.filter(pk=paid.pk).update(isPayed=True)
+        Order.objects.update(reservedAt=timezone.now() - timedelta(minutes=31))
+
+        self.assertEqual(release_expired_reservations(minutes=30), 1)
+
+        self.assertEqual(self._stock(), [(4, 1), (1, 0)])
+
+
+class StockReservationConcurrencyTestCase(TransactionTestCase):
+    """
+    Одновременные оформления заказов на один товар не уходят в минус.
+    """
+
+    threads = 8
+    orders = 40
+    stock = 25
+
+    def _reserve(self, order_id: int) -> bool:
+        try:
+            while True:
+                try:
+                    return reserve_order_stock(order_id)
+                except OperationalError:
+                    # SQLite не допускает параллельной записи: повторяем после снятия блокировки
+                    continue
+        finally:
+            connection.close()
+
+    def test_concurrent_reservations(self):
+        category = Category.objects.create(title='Category')
+        product = Product.objects.create(title='Product', price=10, count=self.stock, rating=0, category=category)
+
+        order_ids = []
+        for i in range(self.orders):
+            order = Order.objects.create()
+            OrderItem.objects.create(order=order, product=product, count=1)
+            order_ids.append(order.pk)
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            results = list(executor.map(self._reserve, order_ids))
+
+        product.refresh_from_db()
+        self.assertEqual(sum(results), self.stock)
+        self.assertEqual(product.count, 0)
+        self.assertEqual(product.sold, self.stock)
+        self.assertEqual(Order.objects.filter(isReserved=True).count(), self.stock)
+
+
+class OrderSerializeTestCase(TestCase):
+    """
+    История заказов сериализуется из снимка товаров за фиксированное кол-во запросов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        tag = Tag.objects.create(name='Tag')
+        cls.user = User.objects.create_user(username='user', password='password')
+
+        cls.products = []
+        for i in range(5):
+            product = Product.objects.create(title=f'Product {i}', price=10, count=100, rating=0, category=category)
+            product.tags.add(tag)
+            ProductImage.objects.create(product=product, src=f'products/product_{i}.png')
+            cls.products.append(product)
+
+    def _create_orders(self, orders_count: int) -> None:
+        lines = [{'id': product.pk, 'count': count} for count, product in enumerate(self.products, start=1)]
+        for i in range(orders_count):
+            self.client.post(reverse('order:order_history'), lines, content_type='application/json')
+
+    def test_snapshot(self):
+        self._create_orders(1)
+
+        # Изменения в каталоге не влияют на историю заказов
+        Product.objects.update(price=99, title='Changed')
+
+        data = OrderSerializer(OrderSerializer.setup_eager_loading(Order.objects), many=True).data
+        products = data[0]['products']
+
+        self.assertEqual([item['id'] for item in products], [product.pk for product in self.products])
+        self.assertEqual([item['count'] for item in products], [1, 2, 3, 4, 5])
+        self.assertEqual(products[0]['price'], '10.00')
+        self.assertEqual(products[0]['title'], 'Product 0')
+        self.assertEqual(products[0]['images'], [{'src': '/media/products/product_0.png', 'alt': 'Product 0'}])
+
+    def test_query_count(self):
+        for orders_count in (1, 10):
+            self._create_orders(orders_count)
+
+            # Заказы и их товары, без таблиц каталога
+            with CaptureQueriesContext(connection) as context:
+                OrderSerializer(OrderSerializer.setup_eager_loading(Order.objects), many=True).data
+
+            self.assertEqual(len(context), 2)
+            self.assertFalse(any('catalog_' in query['sql'] for query in context.captured_queries))
+
+
+class OrderHistoryTestCase(TestCase):
+    """
+    История заказов выдается постранично по ключу и потоком NDJSON.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category')
+        product = Product.objects.create(title='Product', price=10, count=5, rating=0, category=category)
+        cls.user = User.objects.create_user(username='user', password='password')
+
+        for i in range(5):
+            order = Order.objects.create(user=cls.user)
+            OrderItem.objects.create(order=order, product=product)
+
+        # Одинаковое время у части заказов - порядок задает pk
+        Order.objects.filter(pk__in=Order.objects.order_by('pk').values('pk')[:3]).update(createdAt=timezone.now())
+        cls.expected = list(Order.objects.order_by('-createdAt', '-pk').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_keyset_pages(self):
+        ids = []
+        params = {'limit': 2}
+        while True:
+            data = self.client.get(reverse('order:order_history'), params).json()
+            ids += [order['id'] for order in data['items']]
+            if not data['nextCursor']:
+                break
+            params['cursor'] = data['nextCursor']
+
+        self.assertEqual(ids, self.expected)
+
+    def test_stream(self):
+        response = self.client.get(reverse('order:order_history'), {'stream': 'true', 'limit': 2})
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], self.expected)
+        self.assertEqual(len(json.loads(lines[0])['products']), 1)
+
+    def test_first_page_by_default(self):
+        data = self.client.get(reverse('order:order_history')).json()
+
+        self.assertEqual([order['id'] for order in data['items']], self.expected)
+        self.assertEqual(data['currentPage'], 1)
+        self.assertIsNone(data['nextCursor'])
+
+    def test_invalid_cursor(self):
+        cursors = [
+            'WzFd',
+            encode_cursor({}),
+            encode_cursor({'value': 'not a date', 'pk': 1, 'page': 1}),
+            encode_cursor({'value': timezone.now().isoformat(), 'pk': 'x', 'page': 1}),
+        ]
+
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('order:order_history'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
@@ -1,15 +1,100 @@
+import json
+from decimal import Decimal
+
 from django.contrib.auth.models import AnonymousUser
 from django.db.transaction import atomic
-from django.db.models import F
+from django.db.models import F, Q, Case, When, OuterRef, Subquery, QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.utils.encoders import JSONEncoder
 
 from .models import Order, OrderItem
+from catalog.models import Product, ProductImage
 from .serializers import OrderSerializer
+from .pagination import OrderHistoryPagination
 from .permissons import OrderHistoryPermission
+from .stock import reserve_order_stock
+
+
+def _get_order_lines(data) -> dict[int, int]:
+    """
+    Функция для разбора товаров заказа из тела запроса.
+
+    Получает на вход список товаров корзины
+    Возвращает словарь {id товара: кол-во}, одинаковые товары суммируются.
+    Цены из запроса не используются, стоимость считается на сервере.
+    """
+
+    if not isinstance(data, list) or not data:
+        raise ValueError('order must contain products')
+
+    lines = {}
+    for product in data:
+        product_id, count = product['id'], product['count']
+
+        if not isinstance(product_id, int) or not isinstance(count, int) or count <= 0:
+            raise ValueError('id and count must be positive integers')
+
+        lines[product_id] = lines.get(product_id, 0) + count
+
+    return lines
+
+
+def _get_products(product_ids) -> dict[int, Product]:
+    """
+    Функция для получения товаров заказа одним запросом.
+
+    Получает на вход id товаров
+    Возвращает словарь {id товара: товар} с полями для снимка в OrderItem:
+    `activePrice` - цена с учетом действующей скидки (SaleProducts), `primaryImage` - путь к первому изображению.
+    Удаленные и несуществующие товары в словарь не попадают.
+    """
+
+    today = timezone.localdate()
+    primary_image = ProductImage.objects.filter(product=OuterRef('pk')).order_by('pk').values('src')[:1]
+
+    return (
+        Product.objects
+        .filter(isDeleted=False)
+        .annotate(
+            activePrice=Case(
+                When(sales__dateFrom__lte=today, sales__dateTo__gte=today, then=F('sales__salePrice')),
+                default=F('price'),
+            ),
+            primaryImage=Subquery(primary_image),
+        )
+        .only('pk', 'title', 'description')
+        .in_bulk(product_ids)
+    )
+
+
+def _stream_orders(orders: QuerySet, batch_size: int):
+    """
+    Генератор для потоковой выдачи истории заказов в формате NDJSON (один заказ - одна строка).
+
+    Заказы выбираются пачками по ключу (createdAt, pk) с предзагрузкой товаров,
+    поэтому в памяти одновременно находится не больше `batch_size` заказов.
+    """
+
+    last = None
+    while True:
+        batch = orders
+        if last is not None:
+            batch = batch.filter(Q(createdAt__lt=last.createdAt) | Q(createdAt=last.createdAt, pk__lt=last.pk))
+
+        batch = list(OrderSerializer.setup_eager_loading(batch)[:batch_size])
+        if not batch:
+            return
+
+        for order in batch:
+            yield json.dumps(OrderSerializer(order).data, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+        last = batch[-1]
 
 
 class OrdersView(APIView):
@@ -22,14 +107,23 @@ class OrdersView(APIView):
         # Заказы с датой по убыванию
         orders = (
             Order.objects
-            .prefetch_related('orderitem_set') # Для сериализатора нужен только `orderitem_set`
             .filter(user=request.user, isDeleted=False)
-            .order_by('-createdAt')
+            .order_by('-createdAt', '-pk')
         )
 
-        serialized = OrderSerializer(orders, many=True)
+        # Потоковая выдача всей истории: ?stream=true
+        if request.query_params.get('stream') == 'true':
+            page_size = OrderHistoryPagination().get_page_size(request)
+            return StreamingHttpResponse(_stream_orders(orders, page_size), content_type='application/x-ndjson')
 
-        return Response(serialized.data)
+        # Постраничная выдача по ключу: ?limit=...&cursor=..., без курсора - первая страница.
+        # Следующая страница - по `nextCursor`, товары заказов предзагружаются для всей страницы сразу.
+        paginator = OrderHistoryPagination()
+        page = paginator.paginate_queryset(OrderSerializer.setup_eager_loading(orders), request, view=self)
+
+        serialized = OrderSerializer(page, many=True)
+
+        return paginator.get_paginated_response(serialized.data)
 
     # Создание заказа
 
@@ -38,10 +132,30 @@ class OrdersView(APIView):
     @atomic
     def post(self, request: Request) -> Response:
 
+        # Разбираем товары заказа и получаем цены одним запросом.
+        try:
+            lines = _get_order_lines(request.data)
+        except ValueError as e:
+            return Response({'message': str(e)}, status=400)
+        except (KeyError, TypeError) as e:
+            return Response({'message': f'Wrong params: {e}'}, status=400)
+
+        products = _get_products(lines)
+
+        for product_id in lines:
+            if product_id not in products:
+                return Response({'message': f'No product with id {product_id}'}, status=400)
+
+        # Стоимость считается на сервере, клиент не может занизить цену.
+        total_cost = sum(
+            (products[product_id].activePrice * count for product_id, count in lines.items()),
+            Decimal(0)
+        )
+
         # Если пользователь анонимный - создаем пустой заказ
         # Иначе - заполняем его всеми возможными данными.
         if isinstance(request.user, AnonymousUser):
-            order = Order.objects.create()
+            order = Order.objects.create(totalCost=total_cost)
         else:
             # Получаем профиль во избежание множества запросов.
             profile = request.user.profile
@@ -55,25 +169,29 @@ class OrdersView(APIView):
             if check_order and not check_order.isCreated:
                 return Response({'orderId': check_order.pk})
 
-            # Создаем объект заказа для его заполнения.
+            # Создаем объект заказа сразу со стоимостью.
             order = Order.objects.create(
                 user=request.user,
                 fullName=profile.fullName,
                 email = profile.email,
                 phone = profile.phone,
+                totalCost=total_cost,
             )
 
-        # Наполняем заказ товарами из корзины и считаем стоимость.
-        total_cost = 0
-        for product in request.data:
-            order.orderitem_set.create(
-                product_id=product['id'],
-                count=product['count']
+        # Наполняем заказ товарами из корзины одним запросом.
+        # Вместе с товаром сохраняем его снимок: цену покупки, название, описание и изображение.
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=product_id,
+                count=count,
+                price=products[product_id].activePrice,
+                title=products[product_id].title,
+                description=products[product_id].description,
+                imageSrc=products[product_id].primaryImage or '',
             )
-            total_cost += float(product['price']) * int(product['count'])
-
-        order.totalCost = total_cost
-        order.save()
+            for product_id, count in lines.items()
+        ])
 
         return Response({'orderId': order.pk})
 
@@ -85,21 +203,24 @@ class OrderDetailView(APIView):
     def get(self, request: Request, pk) -> Response:
 
         # Заказ по id
-        order = (
-            Order.objects
-            .prefetch_related('orderitem_set') # Для сериализатора нужен только `orderitem_set`
-            .get(pk=pk)
-        )
+        order = OrderSerializer.setup_eager_loading(Order.objects).get(pk=pk)
 
         serialized = OrderSerializer(order)
 
         return Response(serialized.data)
 
+    # Резерв товаров и подтверждение заказа выполняются в одной транзакции
+    @atomic
     def post(self, request: Request, pk) -> Response:
 
         # Заказ по id, здесь QuerySet, так удобнее обновлять
         order = Order.objects.filter(pk=pk)
 
+        # Резервируем товары на складе до оплаты.
+        # Резерв снимается, если заказ не оплачен за ORDER_RESERVATION_TIMEOUT (см. order.stock).
+        if not reserve_order_stock(pk):
+            return Response({'message': 'Not enough products in stock'}, status=400)
+
         # Учитываем стоимость доставки
         if request.data['deliveryType'] == 'express':
             total_cost_upscale = 500
@@ -150,8 +271,14 @@ class PaymentView(APIView):
         elif not 2000 <= int(data['year']) <= 2100:
             return Response({'message': 'year must be positive number between 2000 and 2100.'}, status=400)
 
-        # Подтверждаем оплату
-        order.isPayed = True
-        order.save()
+        # Подтверждаем оплату вместе с резервом товаров.
+        # Если резерв был снят по таймауту - резервируем заново.
+        with atomic():
+            if not reserve_order_stock(order.pk):
+                return Response({'message': 'Not enough products in stock'}, status=400)
+
+            # Резерв мог быть снят между запросами, оплачиваем только зарезервированный заказ
+            if not Order.objects.filter(pk=order.pk, isReserved=True).update(isPayed=True):
+                return Response({'message': 'Order reservation expired, please try again'}, status=409)
 
         return Response({}, status=200)